@@ -1,51 +1,232 @@
 from fastapi import UploadFile, HTTPException
-from sqlalchemy.orm import Session
+from botocore.exceptions import ClientError
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from . import schemas, models
-import boto3
+from .storage import object_url
+import asyncio
+import hashlib
 import os
 from uuid import uuid4
-import io
 
-async def upload_assignment_file(file: UploadFile, assignment_id: int, s3_client) -> str:
-    file_data = await file.read()
+ASSIGNMENT_MAX_UPLOAD_BYTES = int(os.getenv("ASSIGNMENT_MAX_UPLOAD_BYTES", str(500 * 1024 * 1024)))
+# S3 rejects multipart parts smaller than 5 MiB (except the last one)
+UPLOAD_PART_SIZE = max(int(os.getenv("UPLOAD_PART_SIZE", str(8 * 1024 * 1024))), 5 * 1024 * 1024)
+UPLOAD_READ_SIZE = 1024 * 1024
+# Comma-separated MIME types accepted for direct uploads; empty allows any type
+ASSIGNMENT_ALLOWED_CONTENT_TYPES = [
+    content_type.strip()
+    for content_type in os.getenv("ASSIGNMENT_ALLOWED_CONTENT_TYPES", "").split(",")
+    if content_type.strip()
+]
+PRESIGNED_UPLOAD_EXPIRES = int(os.getenv("PRESIGNED_UPLOAD_EXPIRES", "900"))
+PRESIGNED_DOWNLOAD_EXPIRES = int(os.getenv("PRESIGNED_DOWNLOAD_EXPIRES", "900"))
+
+async def upload_assignment_file(file: UploadFile, assignment_id: int, s3_client):
+    """Stream the upload to S3 in fixed-size parts; returns (file_url, sha256 hex digest).
+
+    At most one part is buffered, so memory use does not grow with the file size.
+    """
+    if file.size is not None and file.size > ASSIGNMENT_MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail="File too large")
     bucket_name = os.getenv("S3_BUCKET_NAME")
     file_key = f"assignments/{assignment_id}/{uuid4()}_{file.filename}"
-    s3_client.put_object(
+    content_type = file.content_type or "application/octet-stream"
+    digest = hashlib.sha256()
+    size = 0
+    buffer = bytearray()
+    upload_id = None
+    parts = []
+
+    async def upload_part(body: bytes):
+        response = await asyncio.to_thread(
+            s3_client.upload_part,
+            Bucket=bucket_name,
+            Key=file_key,
+            UploadId=upload_id,
+            PartNumber=len(parts) + 1,
+            Body=body,
+        )
+        parts.append({"PartNumber": len(parts) + 1, "ETag": response["ETag"]})
+
+    try:
+        while chunk := await file.read(UPLOAD_READ_SIZE):
+            size += len(chunk)
+            if size > ASSIGNMENT_MAX_UPLOAD_BYTES:
+                raise HTTPException(status_code=413, detail="File too large")
+            digest.update(chunk)
+            buffer += chunk
+            if len(buffer) >= UPLOAD_PART_SIZE:
+                if upload_id is None:
+                    response = await asyncio.to_thread(
+                        s3_client.create_multipart_upload, Bucket=bucket_name, Key=file_key, ContentType=content_type
+                    )
+                    upload_id = response["UploadId"]
+                await upload_part(bytes(buffer))
+                buffer = bytearray()
+        if upload_id is None:
+            await asyncio.to_thread(
+                s3_client.put_object, Bucket=bucket_name, Key=file_key, Body=bytes(buffer), ContentType=content_type
+            )
+        else:
+            if buffer:
+                await upload_part(bytes(buffer))
+            await asyncio.to_thread(
+                s3_client.complete_multipart_upload,
+                Bucket=bucket_name,
+                Key=file_key,
+                UploadId=upload_id,
+                MultipartUpload={"Parts": parts},
+            )
+    except BaseException:
+        if upload_id is not None:
+            await asyncio.to_thread(
+                s3_client.abort_multipart_upload, Bucket=bucket_name, Key=file_key, UploadId=upload_id
+            )
+        raise
+    return object_url(bucket_name, file_key), digest.hexdigest()
+
+def _direct_upload_prefix(assignment_id: int, user_id: int) -> str:
+    return f"assignments/{assignment_id}/{user_id}/"
+
+def create_upload_ticket(assignment_id: int, user_id: int, upload: schemas.AssignmentUploadRequest, s3_client):
+    if ASSIGNMENT_ALLOWED_CONTENT_TYPES and upload.content_type not in ASSIGNMENT_ALLOWED_CONTENT_TYPES:
+        raise HTTPException(status_code=415, detail="Unsupported file type")
+    if upload.size > ASSIGNMENT_MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail="File too large")
+    bucket_name = os.getenv("S3_BUCKET_NAME")
+    file_key = f"{_direct_upload_prefix(assignment_id, user_id)}{uuid4()}_{os.path.basename(upload.filename)}"
+    # The signed policy pins the key, content type and size, so the client cannot upload anything else with it
+    post = s3_client.generate_presigned_post(
         Bucket=bucket_name,
         Key=file_key,
-        Body=file_data,
-        ContentType=file.content_type,
+        Fields={"Content-Type": upload.content_type},
+        Conditions=[
+            {"Content-Type": upload.content_type},
+            ["content-length-range", 1, min(upload.size, ASSIGNMENT_MAX_UPLOAD_BYTES)],
+        ],
+        ExpiresIn=PRESIGNED_UPLOAD_EXPIRES,
+    )
+    return schemas.AssignmentUploadTicket(
+        key=file_key, url=post["url"], fields=post["fields"], expires_in=PRESIGNED_UPLOAD_EXPIRES
+    )
+
+async def confirm_uploaded_file(db: AsyncSession, assignment_id: int, user_id: int, key: str, s3_client) -> str:
+    if not key.startswith(_direct_upload_prefix(assignment_id, user_id)):
+        raise HTTPException(status_code=400, detail="Upload key does not belong to this assignment")
+    bucket_name = os.getenv("S3_BUCKET_NAME")
+    submitted = await db.scalar(
+        select(models.IndependentSubmission.id).where(
+            models.IndependentSubmission.assignment_id == assignment_id,
+            models.IndependentSubmission.file_url == object_url(bucket_name, key),
+        )
     )
-    file_url = f"https://{bucket_name}.s3.amazonaws.com/{file_key}"
-    return file_url
+    if submitted is not None:
+        raise HTTPException(status_code=409, detail="This upload was already submitted")
+    try:
+        head = await asyncio.to_thread(s3_client.head_object, Bucket=bucket_name, Key=key)
+    except ClientError:
+        raise HTTPException(status_code=404, detail="Uploaded file not found")
+    if head["ContentLength"] > ASSIGNMENT_MAX_UPLOAD_BYTES:
+        await asyncio.to_thread(s3_client.delete_object, Bucket=bucket_name, Key=key)
+        raise HTTPException(status_code=413, detail="File too large")
+    return object_url(bucket_name, key)
 
-def create_practical_assignment(db: Session, assignment: schemas.PracticalAssignmentCreate):
+def _key_from_url(file_url: str, bucket_name: str):
+    prefix = object_url(bucket_name, "")
+    return file_url[len(prefix):] if file_url.startswith(prefix) else None
+
+def create_download_urls(file_urls: list, s3_client) -> list:
+    """Presigned GET links for stored submission files; None for URLs outside the bucket.
+
+    Signing is local to the client (no request to S3), so a whole page costs one call.
+    """
+    bucket_name = os.getenv("S3_BUCKET_NAME")
+    urls = []
+    for file_url in file_urls:
+        key = _key_from_url(file_url, bucket_name)
+        urls.append(
+            None if key is None else s3_client.generate_presigned_url(
+                "get_object", Params={"Bucket": bucket_name, "Key": key}, ExpiresIn=PRESIGNED_DOWNLOAD_EXPIRES
+            )
+        )
+    return urls
+
+async def create_practical_assignment(db: AsyncSession, assignment: schemas.PracticalAssignmentCreate):
     db_assignment = models.PracticalAssignment(**assignment.model_dump())
     db.add(db_assignment)
-    db.commit()
-    db.refresh(db_assignment)
+    await db.commit()
+    await db.refresh(db_assignment)
     return db_assignment
 
-def create_independent_assignment(db: Session, assignment: schemas.IndependentAssignmentCreate):
+async def get_independent_assignment(db: AsyncSession, assignment_id: int):
+    return await db.get(models.IndependentAssignment, assignment_id)
+
+async def create_independent_assignment(db: AsyncSession, assignment: schemas.IndependentAssignmentCreate):
     db_assignment = models.IndependentAssignment(**assignment.model_dump())
     db.add(db_assignment)
-    db.commit()
-    db.refresh(db_assignment)
+    await db.commit()
+    await db.refresh(db_assignment)
     return db_assignment
 
-def create_independent_submission(db: Session, submission: schemas.IndependentSubmissionCreate):
+async def create_independent_submission(db: AsyncSession, submission: schemas.IndependentSubmissionCreate):
     db_submission = models.IndependentSubmission(**submission.model_dump())
     db.add(db_submission)
-    db.commit()
-    db.refresh(db_submission)
+    await db.commit()
+    await db.refresh(db_submission)
     return db_submission
 
-def grade_independent_submission(db: Session, submission_id: int, grade: schemas.IndependentSubmissionGrade):
-    db_submission = db.query(models.IndependentSubmission).filter(models.IndependentSubmission.id == submission_id).first()
+async def get_independent_submissions(
+    db: AsyncSession, assignment_id: int, limit: int = None, after: int = None, ungraded: bool = False
+):
+    query = (
+        select(models.IndependentSubmission, models.User.email)
+        .join(models.User, models.User.id == models.IndependentSubmission.user_id)
+        .where(models.IndependentSubmission.assignment_id == assignment_id)
+        .order_by(models.IndependentSubmission.id)
+    )
+    if ungraded:
+        query = query.where(models.IndependentSubmission.score.is_(None))
+    if after is not None:
+        query = query.where(models.IndependentSubmission.id > after)
+    if limit is not None:
+        query = query.limit(limit)
+    result = await db.execute(query)
+    return result.all()
+
+async def grade_independent_submissions(db: AsyncSession, assignment_id: int, grades: list):
+    """Apply every grade in one transaction, or none if any submission is not in the assignment."""
+    submission_ids = {grade.submission_id for grade in grades}
+    if len(submission_ids) != len(grades):
+        raise HTTPException(status_code=400, detail="Each submission may be graded once per request")
+    result = await db.execute(
+        select(models.IndependentSubmission.id).where(
+            models.IndependentSubmission.id.in_(submission_ids),
+            models.IndependentSubmission.assignment_id == assignment_id,
+        )
+    )
+    missing = submission_ids - set(result.scalars())
+    if missing:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Submissions not found in this assignment: {', '.join(map(str, sorted(missing)))}",
+        )
+    # ORM bulk UPDATE by primary key: one statement executed for all rows
+    await db.execute(
+        update(models.IndependentSubmission)
+        .where(models.IndependentSubmission.assignment_id == assignment_id)
+        .execution_options(synchronize_session=None),
+        [{"id": grade.submission_id, "score": grade.score, "feedback": grade.feedback} for grade in grades],
+    )
+    await db.commit()
+    return len(grades)
+
+async def grade_independent_submission(db: AsyncSession, submission_id: int, grade: schemas.IndependentSubmissionGrade):
+    db_submission = await db.get(models.IndependentSubmission, submission_id)
     if not db_submission:
         raise HTTPException(status_code=404, detail="Submission not found")
     db_submission.score = grade.score
     db_submission.feedback = grade.feedback
-    db.commit()
-    db.refresh(db_submission)
-    return db_submission
\ No newline at end of file
+    await db.commit()
+    await db.refresh(db_submission)
+    return db_submission
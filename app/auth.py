@@ -2,12 +2,13 @@ from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
 from datetime import datetime, timedelta
-from . import schemas
-from sqlalchemy.orm import Session
-from .database import SessionLocal
+from . import schemas, redis_client
+from .database import AsyncSessionLocal
 from .crud import get_user_by_email
-from passlib.context import CryptContext
+from .local_cache import LRUCache
+from uuid import uuid4
 import os
+import time
 
 from .models import UserRole
 
@@ -15,11 +16,21 @@ SECRET_KEY = os.getenv("JWT_SECRET_KEY", "your-secret-key")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
 
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+PRINCIPAL_CHANNEL = "invalidate:principals"
+PRINCIPAL_REDIS_TTL = int(os.getenv("PRINCIPAL_REDIS_TTL", "300"))
+# Token subject (email) -> schemas.Principal
+principals = LRUCache(
+    maxsize=int(os.getenv("PRINCIPAL_CACHE_SIZE", "10000")),
+    ttl=float(os.getenv("PRINCIPAL_CACHE_TTL", "60")),
+)
+_principal_epoch = 0
+
+REVOCATION_CHANNEL = "auth:revoked"
+# jti -> token expiry (unix time); entries are dropped once the token would have expired anyway
+revoked_tokens = {}
+_revoked_pruned_at = 0.0
 
 def create_access_token(data: dict, expires_delta: timedelta = None):
     to_encode = data.copy()
@@ -27,11 +38,108 @@ def create_access_token(data: dict, expires_delta: timedelta = None):
         expire = datetime.utcnow() + expires_delta
     else:
         expire = datetime.utcnow() + timedelta(minutes=15)
-    to_encode.update({"exp": expire})
+    to_encode.update({"exp": expire, "jti": uuid4().hex})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(lambda: SessionLocal())):
+def _principal_key(email: str) -> str:
+    return f"principal:{email}"
+
+async def get_principal(email: str):
+    """Resolve a token subject from the local cache, then Redis, and only then Postgres."""
+    principal = principals.get(email)
+    if principal is not None:
+        return principal
+    epoch = _principal_epoch
+    redis = redis_client.get_redis()
+    cached = await redis_client.cache_get(redis, _principal_key(email))
+    if cached is not None:
+        principal = schemas.Principal.model_validate_json(cached)
+    else:
+        async with AsyncSessionLocal() as db:
+            user = await get_user_by_email(db, email=email)
+        if user is None:
+            return None
+        principal = schemas.Principal.model_validate(user)
+        if epoch == _principal_epoch:
+            await redis_client.cache_setex(redis, _principal_key(email), PRINCIPAL_REDIS_TTL, principal.model_dump_json())
+    if epoch == _principal_epoch:
+        principals.set(email, principal)
+    return principal
+
+def drop_principal(email: str):
+    global _principal_epoch
+    _principal_epoch += 1
+    principals.pop(email)
+
+async def invalidate_principal(*emails: str):
+    if not emails:
+        return
+    for email in emails:
+        drop_principal(email)
+    await redis_client.safe_execute(redis_client.get_redis(), "delete", *(_principal_key(email) for email in emails))
+    # One message per call; emails cannot contain newlines
+    await redis_client.publish(PRINCIPAL_CHANNEL, "\n".join(emails))
+
+async def _on_principal_message(data: str):
+    for email in data.split("\n"):
+        drop_principal(email)
+
+async def _on_principal_resync():
+    global _principal_epoch
+    _principal_epoch += 1
+    principals.clear()
+
+redis_client.subscribe(PRINCIPAL_CHANNEL, _on_principal_message, _on_principal_resync)
+
+def _revoked_key(jti: str) -> str:
+    return f"revoked:{jti}"
+
+def _remember_revoked(jti: str, expires_at: float):
+    global _revoked_pruned_at
+    revoked_tokens[jti] = expires_at
+    now = time.time()
+    if now - _revoked_pruned_at > 60:
+        _revoked_pruned_at = now
+        for expired in [key for key, value in revoked_tokens.items() if value < now]:
+            del revoked_tokens[expired]
+
+def is_revoked(jti: str) -> bool:
+    expires_at = revoked_tokens.get(jti)
+    return expires_at is not None and expires_at >= time.time()
+
+async def revoke_token(token: str) -> bool:
+    """Revoke the token on every worker; False if Redis could not take the revocation, so only this worker knows."""
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        return True
+    jti, expires_at = payload.get("jti"), payload.get("exp")
+    if jti is None or expires_at is None:
+        return True
+    ttl = int(expires_at - time.time()) + 1
+    if ttl <= 0:
+        return True
+    _remember_revoked(jti, expires_at)
+    # The key covers workers that resync after a disconnect, the message the ones already listening
+    stored = await redis_client.cache_setex(redis_client.get_redis(), _revoked_key(jti), ttl, expires_at)
+    return stored and await redis_client.publish(REVOCATION_CHANNEL, f"{jti}:{expires_at}")
+
+async def _on_revocation_message(data: str):
+    jti, _, expires_at = data.partition(":")
+    _remember_revoked(jti, float(expires_at))
+
+async def _on_revocation_resync():
+    # Reload the full set: revocations published while this worker was disconnected were missed
+    redis = redis_client.get_redis()
+    async for key in redis.scan_iter(match=_revoked_key("*"), count=1000):
+        expires_at = await redis.get(key)
+        if expires_at is not None:
+            _remember_revoked(key.decode().removeprefix(_revoked_key("")), float(expires_at))
+
+redis_client.subscribe(REVOCATION_CHANNEL, _on_revocation_message, _on_revocation_resync)
+
+async def get_current_user(token: str = Depends(oauth2_scheme)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -44,17 +152,19 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
             raise credentials_exception
     except JWTError:
         raise credentials_exception
-    user = get_user_by_email(db, email=email)
-    if user is None:
+    if is_revoked(payload.get("jti")):
+        raise credentials_exception
+    principal = await get_principal(email)
+    if principal is None:
         raise credentials_exception
-    return user
+    return principal
 
-def get_current_teacher_or_admin(current_user: schemas.User = Depends(get_current_user)):
+def get_current_teacher_or_admin(current_user: schemas.Principal = Depends(get_current_user)):
     if current_user.role not in [UserRole.teacher, UserRole.superadmin]:
         raise HTTPException(status_code=403, detail="Not authorized")
     return current_user
 
-def get_current_admin(current_user: schemas.User = Depends(get_current_user)):
+def get_current_admin(current_user: schemas.Principal = Depends(get_current_user)):
     if current_user.role != UserRole.superadmin:
         raise HTTPException(status_code=403, detail="Not authorized")
     return current_user
\ No newline at end of file
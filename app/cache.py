@@ -0,0 +1,109 @@
+"""
+# Versioned Redis cache for read endpoints
+"""
+
+from fastapi import Request, Response
+from pydantic import TypeAdapter
+from redis.asyncio import Redis
+from typing import NamedTuple
+import asyncio
+import hashlib
+import orjson
+import os
+import time
+from .redis_client import cache_get, cache_setex, safe_execute
+
+# Entries live for CACHE_TTL; after CACHE_FRESH_TTL one caller rebuilds them while the rest keep serving the old copy
+CACHE_TTL = int(os.getenv("CACHE_TTL", "3600"))
+CACHE_FRESH_TTL = int(os.getenv("CACHE_FRESH_TTL", "300"))
+CACHE_LOCK_TTL_MS = int(os.getenv("CACHE_LOCK_TTL_MS", "10000"))
+CACHE_WAIT_TIMEOUT = float(os.getenv("CACHE_WAIT_TIMEOUT", "2"))
+CACHE_WAIT_INTERVAL = 0.05
+HTTP_CACHE_CONTROL = os.getenv("HTTP_CACHE_CONTROL", "public, max-age=30, must-revalidate")
+# For responses behind authentication: shared caches must not keep them, browsers revalidate by ETag
+PRIVATE_CACHE_CONTROL = "private, no-cache"
+
+class CachedBody(NamedTuple):
+    etag: str
+    body: bytes
+
+def _version_key(namespace: str) -> str:
+    return f"cache:ver:{namespace}"
+
+async def get_version(redis: Redis, namespace: str) -> int:
+    return int(await cache_get(redis, _version_key(namespace)) or 0)
+
+async def bump(redis: Redis, *namespaces: str):
+    for namespace in namespaces:
+        await safe_execute(redis, "incr", _version_key(namespace))
+
+def _pack(cached: CachedBody) -> bytes:
+    return f"{time.time() + CACHE_FRESH_TTL:.3f} {cached.etag}".encode() + b"\n" + cached.body
+
+def _unpack(raw: bytes):
+    header, _, body = raw.partition(b"\n")
+    fresh_until, etag = header.decode().split(" ")
+    return float(fresh_until), CachedBody(etag, body)
+
+def encode(adapter: TypeAdapter, data, include=None) -> CachedBody:
+    body = orjson.dumps(adapter.dump_python(adapter.validate_python(data, from_attributes=True), include=include))
+    return CachedBody(hashlib.blake2b(body, digest_size=16).hexdigest(), body)
+
+async def acquire_lock(redis: Redis, cache_key: str, ttl_ms: int = CACHE_LOCK_TTL_MS) -> bool:
+    # With Redis unavailable every caller just loads from the source
+    return bool(await safe_execute(redis, "set", f"lock:{cache_key}", 1, nx=True, px=ttl_ms, default=True))
+
+async def release_lock(redis: Redis, cache_key: str):
+    await safe_execute(redis, "delete", f"lock:{cache_key}")
+
+async def _rebuild(redis: Redis, cache_key: str, adapter: TypeAdapter, loader, include):
+    try:
+        data = await loader()
+        if data is None:
+            return None
+        cached = encode(adapter, data, include)
+        await cache_setex(redis, cache_key, CACHE_TTL, _pack(cached))
+        return cached
+    finally:
+        await release_lock(redis, cache_key)
+
+async def get_or_load(redis: Redis, namespace: str, key: str, adapter: TypeAdapter, loader, include=None):
+    """Return the cached JSON response body and its ETag for `key`, calling `loader` on a miss.
+
+    `loader` is an async callable returning ORM objects (or None for "not
+    found", which is not cached); they are validated through `adapter` and
+    encoded once, so a hit returns the stored bytes untouched. `include`
+    restricts the encoded fields as in pydantic's dump_python.
+    """
+    version = await get_version(redis, namespace)
+    cache_key = f"cache:{namespace}:v{version}:{key}"
+    raw = await cache_get(redis, cache_key)
+    if raw is not None:
+        fresh_until, cached = _unpack(raw)
+        if fresh_until > time.time() or not await acquire_lock(redis, cache_key):
+            return cached
+        return await _rebuild(redis, cache_key, adapter, loader, include)
+    if await acquire_lock(redis, cache_key):
+        return await _rebuild(redis, cache_key, adapter, loader, include)
+    deadline = time.monotonic() + CACHE_WAIT_TIMEOUT
+    while time.monotonic() < deadline:
+        await asyncio.sleep(CACHE_WAIT_INTERVAL)
+        raw = await cache_get(redis, cache_key)
+        if raw is not None:
+            return _unpack(raw)[1]
+    data = await loader()
+    return None if data is None else encode(adapter, data, include)
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    if if_none_match.strip() == "*":
+        return True
+    # If-None-Match uses weak comparison, so a W/ prefix is ignored
+    candidates = (tag.strip().removeprefix("W/").strip('"') for tag in if_none_match.split(","))
+    return etag in candidates
+
+def json_response(request: Request, cached: CachedBody, cache_control: str = HTTP_CACHE_CONTROL) -> Response:
+    headers = {"ETag": f'"{cached.etag}"', "Cache-Control": cache_control}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and _etag_matches(if_none_match, cached.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=cached.body, media_type="application/json", headers=headers)
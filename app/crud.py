@@ -1,132 +1,398 @@
-from sqlalchemy.orm import Session
+from sqlalchemy import select, insert, update, func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload, noload
 from . import models, schemas
-from passlib.context import CryptContext
+from . import redis_client, passwords, gradebook, cache, feedback_cache, item_analysis
+from .local_cache import LRUCache
+from datetime import datetime
+import os
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+ANSWER_KEY_CHANNEL = "invalidate:answer_keys"
+# test_id -> {question_id: correct_answer}; the TTL bounds staleness if an invalidation message is missed
+answer_keys = LRUCache(
+    maxsize=int(os.getenv("ANSWER_KEY_CACHE_SIZE", "1024")),
+    ttl=float(os.getenv("ANSWER_KEY_CACHE_TTL", "600")),
+)
+_answer_key_epoch = 0
+# Users inserted per statement by create_users
+USER_IMPORT_BATCH = int(os.getenv("USER_IMPORT_BATCH", "500"))
 
-def get_user_by_email(db: Session, email: str):
-    return db.query(models.User).filter(models.User.email == email).first()
+# Loader options per response shape: the nested collections in the schemas are either loaded in one
+# extra SELECT ... IN query for the whole page or not loaded at all, never lazily per row
+TOPIC_DETAIL = (selectinload(models.Topic.items),)
+TOPIC_SUMMARY = (noload(models.Topic.items),)
+TEST_DETAIL = (selectinload(models.Test.questions),)
+TEST_SUMMARY = (noload(models.Test.questions),)
+GROUP_DETAIL = (selectinload(models.Group.users),)
+GROUP_SUMMARY = (noload(models.Group.users),)
 
-def get_user(db: Session, user_id: int):
-    return db.query(models.User).filter(models.User.id == user_id).first()
+async def get_user_by_email(db: AsyncSession, email: str):
+    result = await db.execute(select(models.User).where(models.User.email == email))
+    return result.scalars().first()
 
-def get_users(db: Session):
-    return db.query(models.User).all()
+async def get_user(db: AsyncSession, user_id: int):
+    return await db.get(models.User, user_id)
 
-def create_user(db: Session, user: schemas.UserCreate):
-    hashed_password = pwd_context.hash(user.password)
+def _keyset_page(query, id_column, limit: int = None, after: int = None):
+    query = query.order_by(id_column)
+    if after is not None:
+        query = query.where(id_column > after)
+    if limit is not None:
+        query = query.limit(limit)
+    return query
+
+async def get_users(db: AsyncSession, limit: int = None, after: int = None):
+    result = await db.execute(_keyset_page(select(models.User), models.User.id, limit, after))
+    return result.scalars().all()
+
+async def create_user(db: AsyncSession, user: schemas.UserCreate):
+    hashed_password = await passwords.hash_password(user.password)
     db_user = models.User(email=user.email, hashed_password=hashed_password, role=user.role, group_id=user.group_id)
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
     return db_user
 
-def update_user(db: Session, user_id: int, user: schemas.UserUpdate):
-    db_user = get_user(db, user_id)
+async def update_user(db: AsyncSession, user_id: int, user: schemas.UserUpdate):
+    db_user = await get_user(db, user_id)
     update_data = user.model_dump(exclude_unset=True)
     for key, value in update_data.items():
         setattr(db_user, key, value)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
     return db_user
 
-def get_group(db: Session, group_id: int):
-    return db.query(models.Group).filter(models.Group.id == group_id).first()
+async def set_password_hash(db: AsyncSession, db_user: models.User, hashed_password: str):
+    db_user.hashed_password = hashed_password
+    await db.commit()
+
+async def get_group(db: AsyncSession, group_id: int):
+    return await db.get(models.Group, group_id)
+
+async def get_groups(db: AsyncSession, limit: int = None, after: int = None, with_users: bool = True):
+    options = GROUP_DETAIL if with_users else GROUP_SUMMARY
+    result = await db.execute(_keyset_page(select(models.Group).options(*options), models.Group.id, limit, after))
+    return result.scalars().all()
 
-def create_group(db: Session, group: schemas.GroupCreate):
+async def create_group(db: AsyncSession, group: schemas.GroupCreate):
     db_group = models.Group(**group.model_dump())
     db.add(db_group)
-    db.commit()
-    db.refresh(db_group)
+    await db.commit()
+    await db.refresh(db_group, attribute_names=["users"])
     return db_group
 
-def add_user_to_group(db: Session, group_id: int, user_id: int):
-    db_user = get_user(db, user_id)
+async def add_user_to_group(db: AsyncSession, group_id: int, user_id: int):
+    db_user = await get_user(db, user_id)
     if not db_user:
         raise ValueError("User not found")
-    db_group = get_group(db, group_id)
+    db_group = await get_group(db, group_id)
     if not db_group:
         raise ValueError("Group not found")
     db_user.group_id = group_id
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
     return db_user
 
-def get_topics(db: Session):
-    return db.query(models.Topic).all()
+async def add_users_to_group(db: AsyncSession, group_id: int, user_ids: list):
+    # Returns (id, email) of the users moved; ids that match no user are simply not in it
+    if not await get_group(db, group_id):
+        raise ValueError("Group not found")
+    result = await db.execute(
+        update(models.User)
+        .where(models.User.id.in_(set(user_ids)))
+        .values(group_id=group_id)
+        .returning(models.User.id, models.User.email)
+        .execution_options(synchronize_session=False)
+    )
+    moved = result.all()
+    await db.commit()
+    return moved
+
+async def create_users(db: AsyncSession, users: list):
+    results = [schemas.UserImportRow(row=row, email=user.email) for row, user in enumerate(users)]
+    emails = {user.email for user in users}
+    group_ids = {user.group_id for user in users if user.group_id is not None}
+    existing = set((await db.execute(select(models.User.email).where(models.User.email.in_(emails)))).scalars())
+    groups = set()
+    if group_ids:
+        groups = set((await db.execute(select(models.Group.id).where(models.Group.id.in_(group_ids)))).scalars())
+    # Release the connection while bcrypt runs; a concurrent signup is caught by the unique index below
+    await db.rollback()
+
+    pending = []
+    seen = set()
+    for result, user in zip(results, users):
+        if user.email in existing:
+            result.error = "Email already registered"
+        elif user.email in seen:
+            result.error = "Email appears earlier in this import"
+        elif user.group_id is not None and user.group_id not in groups:
+            result.error = f"Group {user.group_id} not found"
+        else:
+            seen.add(user.email)
+            pending.append((result, user))
+    hashes = await passwords.hash_passwords([user.password for _, user in pending])
+    created_at = datetime.utcnow()
+    rows = [
+        {
+            "email": user.email,
+            "hashed_password": hashed,
+            "role": user.role,
+            "group_id": user.group_id,
+            "created_at": created_at,
+        }
+        for (_, user), hashed in zip(pending, hashes)
+    ]
+    ids = {}
+    try:
+        for start in range(0, len(rows), USER_IMPORT_BATCH):
+            inserted = await db.execute(
+                insert(models.User).returning(models.User.id, models.User.email), rows[start:start + USER_IMPORT_BATCH]
+            )
+            ids.update((email, user_id) for user_id, email in inserted.all())
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        raise ValueError("Some emails were registered while the import ran; nothing was created, retry the import")
+    for result, user in pending:
+        result.id = ids[user.email]
+    return results
 
-def get_topic(db: Session, topic_id: int):
-    return db.query(models.Topic).filter(models.Topic.id == topic_id).first()
+async def get_topics(db: AsyncSession, limit: int = None, after: int = None, with_items: bool = True):
+    options = TOPIC_DETAIL if with_items else TOPIC_SUMMARY
+    result = await db.execute(_keyset_page(select(models.Topic).options(*options), models.Topic.id, limit, after))
+    return result.scalars().all()
 
-def create_topic(db: Session, topic: schemas.TopicCreate):
+async def get_topic(db: AsyncSession, topic_id: int, with_items: bool = True):
+    options = TOPIC_DETAIL if with_items else TOPIC_SUMMARY
+    result = await db.execute(select(models.Topic).options(*options).where(models.Topic.id == topic_id))
+    return result.scalars().first()
+
+async def create_topic(db: AsyncSession, topic: schemas.TopicCreate):
     db_topic = models.Topic(**topic.model_dump())
     db.add(db_topic)
-    db.commit()
-    db.refresh(db_topic)
+    await db.commit()
+    await db.refresh(db_topic, attribute_names=["items"])
     return db_topic
 
-def update_topic(db: Session, topic_id: int, topic: schemas.TopicCreate):
-    db_topic = get_topic(db, topic_id)
+async def update_topic(db: AsyncSession, topic_id: int, topic: schemas.TopicCreate):
+    db_topic = await get_topic(db, topic_id)
     update_data = topic.model_dump()
     for key, value in update_data.items():
         setattr(db_topic, key, value)
-    db.commit()
-    db.refresh(db_topic)
+    await db.commit()
     return db_topic
 
-def delete_topic(db: Session, topic_id: int):
-    db_topic = get_topic(db, topic_id)
-    db.delete(db_topic)
-    db.commit()
+async def delete_topic(db: AsyncSession, topic_id: int):
+    db_topic = await get_topic(db, topic_id)
+    await db.delete(db_topic)
+    await db.commit()
 
-def create_topic_item(db: Session, item: schemas.TopicItemCreate):
+async def create_topic_item(db: AsyncSession, item: schemas.TopicItemCreate):
     db_item = models.TopicItem(**item.model_dump())
     db.add(db_item)
-    db.commit()
-    db.refresh(db_item)
+    await db.commit()
+    await db.refresh(db_item)
     return db_item
 
-def get_tests_by_topic(db: Session, topic_id: int):
-    return db.query(models.Test).filter(models.Test.topic_id == topic_id).all()
+async def create_topic_items(db: AsyncSession, topic_id: int, items: list, order: int = None):
+    """Insert items as consecutive positions starting at `order`, or after the last item when it is None.
+
+    Existing items at or after `order` are shifted down by len(items) in a single UPDATE.
+    """
+    if not items:
+        return []
+    if order is None:
+        order = await db.scalar(
+            select(func.coalesce(func.max(models.TopicItem.order) + 1, 0)).where(models.TopicItem.topic_id == topic_id)
+        )
+    else:
+        await db.execute(
+            update(models.TopicItem)
+            .where(models.TopicItem.topic_id == topic_id, models.TopicItem.order >= order)
+            .values(order=models.TopicItem.order + len(items))
+            .execution_options(synchronize_session=False)
+        )
+    result = await db.scalars(
+        insert(models.TopicItem).returning(models.TopicItem),
+        [
+            {"topic_id": topic_id, "type": item.type, "content": item.content, "order": order + i}
+            for i, item in enumerate(items)
+        ],
+    )
+    db_items = result.all()
+    await db.commit()
+    return db_items
+
+async def get_tests_by_topic(
+    db: AsyncSession, topic_id: int, limit: int = None, after: int = None, with_questions: bool = True
+):
+    options = TEST_DETAIL if with_questions else TEST_SUMMARY
+    query = select(models.Test).options(*options).where(models.Test.topic_id == topic_id)
+    result = await db.execute(_keyset_page(query, models.Test.id, limit, after))
+    return result.scalars().all()
 
-def create_test(db: Session, test: schemas.TestCreate):
+async def get_test(db: AsyncSession, test_id: int):
+    return await db.get(models.Test, test_id)
+
+async def create_test(db: AsyncSession, test: schemas.TestCreate):
     db_test = models.Test(**test.model_dump())
     db.add(db_test)
-    db.commit()
-    db.refresh(db_test)
+    await db.commit()
+    await db.refresh(db_test, attribute_names=["questions"])
     return db_test
 
-def get_questions_by_test(db: Session, test_id: int):
-    return db.query(models.Question).filter(models.Question.test_id == test_id).all()
+async def get_questions_by_test(db: AsyncSession, test_id: int):
+    result = await db.execute(select(models.Question).where(models.Question.test_id == test_id))
+    return result.scalars().all()
+
+async def get_question(db: AsyncSession, question_id: int):
+    return await db.get(models.Question, question_id)
 
-def create_question(db: Session, question: schemas.QuestionCreate):
+async def create_question(db: AsyncSession, question: schemas.QuestionCreate):
     db_question = models.Question(**question.model_dump())
     db.add(db_question)
-    db.commit()
-    db.refresh(db_question)
+    await db.commit()
+    await db.refresh(db_question)
     return db_question
 
-def create_user_response(db: Session, response: schemas.UserResponseCreate):
+async def update_question(db: AsyncSession, question_id: int, question: schemas.QuestionUpdate):
+    db_question = await get_question(db, question_id)
+    update_data = question.model_dump(exclude_unset=True)
+    for key, value in update_data.items():
+        setattr(db_question, key, value)
+    await db.commit()
+    await db.refresh(db_question)
+    return db_question
+
+async def create_user_response(db: AsyncSession, response: schemas.UserResponseCreate):
     db_response = models.UserResponse(**response.model_dump())
     db.add(db_response)
-    db.commit()
-    db.refresh(db_response)
+    await db.commit()
+    await db.refresh(db_response)
     return db_response
 
-def calculate_test_score(db: Session, test_id: int, submission: schemas.TestSubmission):
+async def get_answer_key(db: AsyncSession, test_id: int):
+    answer_key = answer_keys.get(test_id)
+    if answer_key is not None:
+        return answer_key
+    epoch = _answer_key_epoch
+    result = await db.execute(
+        select(models.Question.id, models.Question.correct_answer).where(models.Question.test_id == test_id)
+    )
+    answer_key = dict(result.all())
+    # Don't cache a key that an invalidation raced with while it was loading
+    if epoch == _answer_key_epoch:
+        answer_keys.set(test_id, answer_key)
+    return answer_key
+
+def drop_answer_key(test_id: int):
+    global _answer_key_epoch
+    _answer_key_epoch += 1
+    answer_keys.pop(test_id)
+
+async def invalidate_answer_key(test_id: int):
+    drop_answer_key(test_id)
+    await redis_client.publish(ANSWER_KEY_CHANNEL, test_id)
+
+async def invalidate_test_content(db: AsyncSession, redis, *test_ids: int):
+    # Everything cached from the tests' questions, plus their topics' test lists
+    test_ids = set(test_ids)
+    for test_id in test_ids:
+        await invalidate_answer_key(test_id)
+    result = await db.execute(select(models.Test.topic_id).where(models.Test.id.in_(test_ids)).distinct())
+    namespaces = [f"tests:{topic_id}" for topic_id in result.scalars()]
+    for test_id in test_ids:
+        namespaces += [f"questions:{test_id}", feedback_cache.namespace(test_id), item_analysis.namespace(test_id)]
+    await cache.bump(redis, *namespaces)
+
+async def _on_answer_key_message(data: str):
+    drop_answer_key(int(data))
+
+async def _on_answer_key_resync():
+    global _answer_key_epoch
+    _answer_key_epoch += 1
+    answer_keys.clear()
+
+redis_client.subscribe(ANSWER_KEY_CHANNEL, _on_answer_key_message, _on_answer_key_resync)
+
+async def grade_submission(db: AsyncSession, test_id: int, submission: schemas.TestSubmission):
+    answer_key = await get_answer_key(db, test_id)
+    if not answer_key:
+        # No such test, or nothing to grade yet; either way nothing may be stored or queued for it
+        raise LookupError(f"Test {test_id} not found or has no questions")
     correct_count = 0
+    incorrect_answers = []
+    answered = set()
     for answer in submission.answers:
-        if is_answer_correct(db, answer):
+        if answer.question_id not in answer_key:
+            raise ValueError(f"Question {answer.question_id} does not belong to test {test_id}")
+        if answer.question_id in answered:
+            raise ValueError(f"Question {answer.question_id} answered more than once")
+        answered.add(answer.question_id)
+        if answer_key[answer.question_id] == answer.selected_answer:
             correct_count += 1
-    return correct_count
+        else:
+            incorrect_answers.append(answer)
+    total_questions = len(answer_key)
+    score = correct_count / total_questions * 100
+    return schemas.TestGrade(
+        correct_count=correct_count,
+        total_questions=total_questions,
+        score=score,
+        incorrect_answers=incorrect_answers,
+    )
+
+async def save_test_attempt(
+    db: AsyncSession,
+    user: schemas.Principal,
+    test_id: int,
+    grade: schemas.TestGrade,
+    answers: list,
+    feedback_text: str = None,
+    feedback_status: models.FeedbackStatus = models.FeedbackStatus.ready,
+):
+    submitted_at = datetime.utcnow()
+    if answers:
+        await db.execute(
+            insert(models.UserResponse),
+            [
+                {
+                    "user_id": user.id,
+                    "question_id": answer.question_id,
+                    "selected_answer": answer.selected_answer,
+                    "submitted_at": submitted_at,
+                }
+                for answer in answers
+            ],
+        )
+    await gradebook.record_attempt(db, user.id, user.group_id, test_id, grade.score, submitted_at)
+    db_feedback = models.Feedback(
+        user_id=user.id,
+        test_id=test_id,
+        feedback_text=feedback_text,
+        status=feedback_status,
+        created_at=submitted_at,
+    )
+    db.add(db_feedback)
+    await db.commit()
+    return db_feedback
+
+async def get_feedback(db: AsyncSession, feedback_id: int):
+    return await db.get(models.Feedback, feedback_id)
 
-def is_answer_correct(db: Session, answer: schemas.Answer):
-    question = db.query(models.Question).filter(models.Question.id == answer.question_id).first()
-    return question and question.correct_answer == answer.selected_answer
+async def set_feedback_result(db: AsyncSession, feedback_id: int, status: models.FeedbackStatus, feedback_text: str = None):
+    await db.execute(
+        update(models.Feedback)
+        .where(models.Feedback.id == feedback_id)
+        .values(status=status, feedback_text=feedback_text)
+    )
+    await db.commit()
 
-def create_feedback(db: Session, feedback: schemas.FeedbackCreate):
+async def create_feedback(db: AsyncSession, feedback: schemas.FeedbackCreate):
     db_feedback = models.Feedback(**feedback.model_dump())
     db.add(db_feedback)
-    db.commit()
-    db.refresh(db_feedback)
-    return db_feedback
\ No newline at end of file
+    await db.commit()
+    await db.refresh(db_feedback)
+    return db_feedback
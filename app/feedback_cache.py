@@ -0,0 +1,88 @@
+"""
+# Reuse generated feedback for identical mistake patterns on a test
+"""
+
+from redis.asyncio import Redis
+import asyncio
+import hashlib
+import json
+import os
+import time
+from . import cache
+from .local_cache import LRUCache
+from .redis_client import cache_get, cache_setex, safe_execute
+
+FEEDBACK_CACHE_TTL = int(os.getenv("FEEDBACK_CACHE_TTL", str(7 * 24 * 3600)))
+FEEDBACK_LOCK_TTL_MS = int(os.getenv("FEEDBACK_LOCK_TTL_MS", "120000"))
+FEEDBACK_WAIT_TIMEOUT = float(os.getenv("FEEDBACK_WAIT_TIMEOUT", "90"))
+FEEDBACK_WAIT_INTERVAL = 0.25
+# Estimated provider price, used only to report savings
+FEEDBACK_COST_PER_1K_TOKENS = float(os.getenv("FEEDBACK_COST_PER_1K_TOKENS", "0.01"))
+METRICS_KEY = "metrics:feedback_cache"
+
+local_entries = LRUCache(
+    maxsize=int(os.getenv("FEEDBACK_CACHE_SIZE", "2048")),
+    ttl=float(os.getenv("FEEDBACK_LOCAL_TTL", "3600")),
+)
+
+def namespace(test_id: int) -> str:
+    return f"feedback:{test_id}"
+
+def fingerprint(topic_id: int, correct_count: int, total_questions: int, incorrect_answers: list) -> str:
+    # Everything openai_service.build_prompt puts in the prompt, so a hit is the text the provider would have written
+    mistakes = sorted((answer.question_id, answer.selected_answer) for answer in incorrect_answers)
+    return hashlib.sha256(json.dumps([topic_id, correct_count, total_questions, mistakes]).encode()).hexdigest()
+
+async def _record(redis: Redis, field: str, amount: int = 1):
+    await safe_execute(redis, "hincrby", METRICS_KEY, field, amount)
+
+async def get_or_generate(
+    redis: Redis, test_id: int, topic_id: int, correct_count: int, total_questions: int, incorrect_answers: list, generate
+):
+    """Return feedback text for this attempt's result, calling `generate` only if nobody has produced it yet.
+
+    `generate` is an async callable returning (text, tokens_used). Concurrent
+    callers with the same pattern wait for the one holding the lock.
+    """
+    version = await cache.get_version(redis, namespace(test_id))
+    key = fingerprint(topic_id, correct_count, total_questions, incorrect_answers)
+    cache_key = f"feedback_cache:{test_id}:v{version}:{key}"
+    entry = local_entries.get(cache_key)
+    owns_lock = False
+    if entry is None:
+        raw = await cache_get(redis, cache_key)
+        if raw is None:
+            owns_lock = await cache.acquire_lock(redis, cache_key, FEEDBACK_LOCK_TTL_MS)
+        if raw is None and not owns_lock:
+            deadline = time.monotonic() + FEEDBACK_WAIT_TIMEOUT
+            while raw is None and time.monotonic() < deadline:
+                await asyncio.sleep(FEEDBACK_WAIT_INTERVAL)
+                raw = await cache_get(redis, cache_key)
+        if raw is not None:
+            entry = json.loads(raw)
+    if entry is not None:
+        local_entries.set(cache_key, entry)
+        await _record(redis, "hits")
+        await _record(redis, "tokens_saved", entry["tokens"])
+        return entry["text"]
+    try:
+        text, tokens = await generate()
+        entry = {"text": text, "tokens": tokens}
+        await cache_setex(redis, cache_key, FEEDBACK_CACHE_TTL, json.dumps(entry))
+        local_entries.set(cache_key, entry)
+    finally:
+        if owns_lock:
+            await cache.release_lock(redis, cache_key)
+    await _record(redis, "misses")
+    await _record(redis, "tokens_used", tokens)
+    return text
+
+async def stats(redis: Redis):
+    raw = await safe_execute(redis, "hgetall", METRICS_KEY, default={})
+    metrics = {key.decode(): int(value) for key, value in raw.items()}
+    hits, misses = metrics.get("hits", 0), metrics.get("misses", 0)
+    return {
+        **metrics,
+        "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+        "estimated_cost_saved": metrics.get("tokens_saved", 0) / 1000 * FEEDBACK_COST_PER_1K_TOKENS,
+    }
@@ -0,0 +1,229 @@
+"""
+# Gradebook: per user x test and per group x test rollups of test attempts
+# Rebuild from the response history: python -m app.gradebook backfill
+"""
+
+from sqlalchemy import select, delete, insert, func, case
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import datetime
+import argparse
+import asyncio
+import logging
+import os
+from . import models, schemas
+from .database import AsyncSessionLocal
+
+logger = logging.getLogger("app.gradebook")
+
+PASS_SCORE = 60
+BACKFILL_BATCH = int(os.getenv("GRADEBOOK_BACKFILL_BATCH", "1000"))
+GROUP_COUNTERS = ("students", "attempts", "passed_students", "score_total", "best_score_total")
+
+def _group_delta(score: float, previous_best: float = None) -> dict:
+    # What one attempt adds to its group x test row, given the student's best score before it
+    best = score if previous_best is None else max(previous_best, score)
+    passed_before = previous_best is not None and previous_best >= PASS_SCORE
+    return {
+        "students": int(previous_best is None),
+        "attempts": 1,
+        "passed_students": int(best >= PASS_SCORE and not passed_before),
+        "score_total": score,
+        "best_score_total": best - (previous_best or 0),
+    }
+
+def _upsert(db: AsyncSession, model):
+    # INSERT ... ON CONFLICT: Postgres in production, SQLite in the test suite
+    return (sqlite if db.bind.dialect.name == "sqlite" else postgresql).insert(model)
+
+async def _locked_entry(db: AsyncSession, user_id: int, test_id: int):
+    result = await db.execute(
+        select(models.GradebookEntry)
+        .where(models.GradebookEntry.user_id == user_id, models.GradebookEntry.test_id == test_id)
+        .with_for_update()
+        .execution_options(populate_existing=True)
+    )
+    return result.scalars().first()
+
+async def record_attempt(
+    db: AsyncSession, user_id: int, group_id: int, test_id: int, score: float, submitted_at: datetime
+):
+    # Does not commit: runs in the transaction that stores the attempt's responses
+    entry = await _locked_entry(db, user_id, test_id)
+    if entry is None:
+        created = await db.execute(
+            _upsert(db, models.GradebookEntry)
+            .values(
+                user_id=user_id,
+                test_id=test_id,
+                best_score=score,
+                last_score=score,
+                attempts=1,
+                last_attempt_at=submitted_at,
+            )
+            .on_conflict_do_nothing()
+            .returning(models.GradebookEntry.user_id)
+        )
+        if created.first() is None:
+            # A concurrent first attempt inserted the row after our SELECT; wait for its lock
+            entry = await _locked_entry(db, user_id, test_id)
+    previous_best = None
+    if entry is not None:
+        previous_best = entry.best_score
+        entry.best_score = max(previous_best, score)
+        entry.last_score = score
+        entry.attempts += 1
+        entry.last_attempt_at = submitted_at
+    if group_id is None:
+        return
+    stmt = _upsert(db, models.GroupTestStats).values(
+        test_id=test_id, group_id=group_id, **_group_delta(score, previous_best)
+    )
+    await db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[models.GroupTestStats.test_id, models.GroupTestStats.group_id],
+            set_={name: getattr(models.GroupTestStats, name) + getattr(stmt.excluded, name) for name in GROUP_COUNTERS},
+        )
+    )
+
+async def get_group_gradebook(
+    db: AsyncSession, group_id: int, limit: int = None, after: int = None, test_id: int = None
+):
+    # Pages by student id; each student carries every gradebook entry they have
+    query = select(models.User.id, models.User.email).where(models.User.group_id == group_id).order_by(models.User.id)
+    if after is not None:
+        query = query.where(models.User.id > after)
+    if limit is not None:
+        query = query.limit(limit)
+    students = (await db.execute(query)).all()
+    if not students:
+        return []
+    query = select(models.GradebookEntry).where(models.GradebookEntry.user_id.in_([user_id for user_id, _ in students]))
+    if test_id is not None:
+        query = query.where(models.GradebookEntry.test_id == test_id)
+    entries = {}
+    for entry in (await db.execute(query.order_by(models.GradebookEntry.test_id))).scalars():
+        entries.setdefault(entry.user_id, []).append(schemas.GradebookEntry.model_validate(entry))
+    return [
+        schemas.GradebookRow(user_id=user_id, email=email, entries=entries.get(user_id, []))
+        for user_id, email in students
+    ]
+
+async def get_test_stats(db: AsyncSession, test_id: int):
+    result = await db.execute(
+        select(models.GroupTestStats, models.Group.name)
+        .join(models.Group, models.Group.id == models.GroupTestStats.group_id)
+        .where(models.GroupTestStats.test_id == test_id)
+        .order_by(models.GroupTestStats.group_id)
+    )
+    groups = [
+        schemas.GroupTestStats(
+            group_id=stats.group_id,
+            group_name=name,
+            students=stats.students,
+            attempts=stats.attempts,
+            passed_students=stats.passed_students,
+            average_score=stats.score_total / stats.attempts,
+            average_best_score=stats.best_score_total / stats.students,
+        )
+        for stats, name in result.all()
+    ]
+    return schemas.TestStats(test_id=test_id, groups=groups)
+
+async def backfill(db: AsyncSession):
+    # Every submission stores one Feedback row, stamped no earlier than its responses; a response belongs to
+    # the first feedback of its user and test from then on. Timestamps alone cannot tell attempts apart:
+    # older submissions stamped each response separately, so one attempt can straddle a second boundary.
+    # A submission whose feedback call failed left responses but no feedback, so they fall into the next
+    # attempt; only the latest response to each question counts, as a retry answers the same questions
+    totals = dict(
+        (await db.execute(select(models.Question.test_id, func.count()).group_by(models.Question.test_id))).all()
+    )
+    groups = dict(
+        (await db.execute(select(models.User.id, models.User.group_id).where(models.User.group_id.is_not(None)))).all()
+    )
+    attempt_id = (
+        select(models.Feedback.id)
+        .where(
+            models.Feedback.user_id == models.UserResponse.user_id,
+            models.Feedback.test_id == models.Question.test_id,
+            models.Feedback.created_at >= models.UserResponse.submitted_at,
+        )
+        .order_by(models.Feedback.created_at, models.Feedback.id)
+        .limit(1)
+        .scalar_subquery()
+    )
+    responses = (
+        select(
+            models.UserResponse.user_id,
+            models.Question.test_id,
+            attempt_id.label("attempt_id"),
+            models.UserResponse.question_id,
+            case((models.UserResponse.selected_answer == models.Question.correct_answer, 1), else_=0).label("correct"),
+            models.UserResponse.submitted_at,
+            models.UserResponse.id,
+        )
+        .join(models.Question, models.Question.id == models.UserResponse.question_id)
+        .subquery()
+    )
+    latest = select(
+        responses.c.user_id,
+        responses.c.test_id,
+        responses.c.attempt_id,
+        responses.c.correct,
+        func.row_number()
+        .over(
+            partition_by=(responses.c.user_id, responses.c.attempt_id, responses.c.question_id),
+            order_by=(responses.c.submitted_at.desc(), responses.c.id.desc()),
+        )
+        .label("position"),
+    ).subquery()
+    # Responses with no feedback after them never completed a submission and are left out
+    attempts = (
+        select(latest.c.user_id, latest.c.test_id, models.Feedback.created_at, func.sum(latest.c.correct))
+        .join(models.Feedback, models.Feedback.id == latest.c.attempt_id)
+        .where(latest.c.position == 1)
+        .group_by(latest.c.user_id, latest.c.test_id, models.Feedback.id, models.Feedback.created_at)
+        .order_by(models.Feedback.created_at, models.Feedback.id)
+    )
+    entries = {}
+    stats = {}
+    async for user_id, test_id, submitted_at, correct in await db.stream(attempts):
+        score = correct / totals[test_id] * 100 if totals.get(test_id) else 0
+        entry = entries.get((user_id, test_id))
+        previous_best = entry["best_score"] if entry else None
+        if entry is None:
+            entry = {"user_id": user_id, "test_id": test_id, "best_score": score, "attempts": 0}
+            entries[(user_id, test_id)] = entry
+        entry["best_score"] = max(entry["best_score"], score)
+        entry["last_score"] = score
+        entry["attempts"] += 1
+        entry["last_attempt_at"] = submitted_at
+        group_id = groups.get(user_id)
+        if group_id is None:
+            continue
+        row = stats.get((test_id, group_id))
+        if row is None:
+            row = {"test_id": test_id, "group_id": group_id, **dict.fromkeys(GROUP_COUNTERS, 0)}
+            stats[(test_id, group_id)] = row
+        for name, value in _group_delta(score, previous_best).items():
+            row[name] += value
+    await db.execute(delete(models.GradebookEntry))
+    await db.execute(delete(models.GroupTestStats))
+    for model, rows in ((models.GradebookEntry, list(entries.values())), (models.GroupTestStats, list(stats.values()))):
+        for start in range(0, len(rows), BACKFILL_BATCH):
+            await db.execute(insert(model), rows[start:start + BACKFILL_BATCH])
+    await db.commit()
+    return len(entries), len(stats)
+
+async def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m app.gradebook")
+    parser.add_argument("command", choices=["backfill"])
+    parser.parse_args(argv)
+    async with AsyncSessionLocal() as db:
+        entries, group_rows = await backfill(db)
+    logger.info("Rebuilt %d gradebook entries and %d group stats rows", entries, group_rows)
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
@@ -0,0 +1,135 @@
+"""
+# Item analysis of a test's responses: difficulty, discrimination, distractors, reliability
+"""
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+import asyncio
+import numpy as np
+from . import models, schemas
+
+# Codes in the response matrix besides option indexes
+UNANSWERED = -1
+NOT_AN_OPTION = -2
+
+def namespace(test_id: int) -> str:
+    # Bumped on every submission, so anything derived from the responses is cached until the next one
+    return f"responses:{test_id}"
+
+def encode_responses(questions: list, user_ids, question_ids, answers):
+    """Encode response rows as a students x questions matrix of option indexes.
+
+    `questions` are (id, options, correct_answer) in column order; the rows must be
+    ordered by submission time, and a student's first answer to a question wins.
+    Returns (student ids, matrix, answer key) where the key holds each column's
+    correct option index.
+    """
+    students, rows = np.unique(np.asarray(user_ids, dtype=np.int64), return_inverse=True)
+    if not questions:
+        return students, np.empty((len(students), 0), dtype=np.int16), np.empty(0, dtype=np.int16)
+    ids = np.array([question_id for question_id, _, _ in questions], dtype=np.int64)
+    order = np.argsort(ids)
+    response_ids = np.asarray(question_ids, dtype=np.int64)
+    cols = order[np.minimum(np.searchsorted(ids, response_ids, sorter=order), len(ids) - 1)]
+    known = ids[cols] == response_ids
+    # Each distinct answer string is translated once; responses then go through a table lookup
+    distinct = {}
+    answer_codes = np.fromiter((distinct.setdefault(answer, len(distinct)) for answer in answers), np.int64, len(answers))
+    table = np.full((len(questions), len(distinct)), NOT_AN_OPTION, dtype=np.int16)
+    key = np.full(len(questions), NOT_AN_OPTION, dtype=np.int16)
+    for i, (_, options, correct_answer) in enumerate(questions):
+        for option_index, option in enumerate(options):
+            if option in distinct:
+                table[i, distinct[option]] = option_index
+        if correct_answer in options:
+            key[i] = options.index(correct_answer)
+    rows, cols, answer_codes = rows.reshape(-1)[known], cols[known], answer_codes[known]
+    # np.unique keeps the first occurrence of each (student, question) cell
+    cells, first = np.unique(rows * len(questions) + cols, return_index=True)
+    matrix = np.full((len(students), len(questions)), UNANSWERED, dtype=np.int16)
+    matrix.flat[cells] = table[cols[first], answer_codes[first]]
+    return students, matrix, key
+
+def _ratio(numerator, denominator):
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(denominator > 0, numerator / np.where(denominator > 0, denominator, 1), np.nan)
+
+def _optional(value) -> float:
+    return None if np.isnan(value) else float(value)
+
+def analyze(test_id: int, questions: list, matrix: np.ndarray, key: np.ndarray) -> schemas.ItemAnalysis:
+    students, items = matrix.shape
+    answered = matrix != UNANSWERED
+    correct = ((matrix == key) & (matrix >= 0)).astype(np.float64)
+    total = correct.sum(axis=1)
+    p_values = _ratio(correct.sum(axis=0), answered.sum(axis=0))
+
+    discrimination = np.full(items, np.nan)
+    if students:
+        # Corrected point-biserial: each item against the rest of the test, so it does not correlate with itself
+        rest = total[:, None] - correct
+        covariance = (correct * rest).mean(axis=0) - correct.mean(axis=0) * rest.mean(axis=0)
+        discrimination = _ratio(covariance, correct.std(axis=0) * rest.std(axis=0))
+
+    alpha = np.nan
+    if items > 1 and students > 1 and total.var() > 0:
+        alpha = items / (items - 1) * (1 - correct.var(axis=0).sum() / total.var())
+
+    width = max([len(options) for _, options, _ in questions] + [1])
+    chosen = matrix >= 0
+    cells = (np.nonzero(chosen)[1] * width + matrix[chosen]).astype(np.int64)
+    counts = np.bincount(cells, minlength=items * width).reshape(items, width)
+    score_sums = np.bincount(cells, weights=np.broadcast_to(total[:, None], matrix.shape)[chosen], minlength=items * width)
+    mean_scores = _ratio(score_sums.reshape(items, width), counts)
+    responses = answered.sum(axis=0)
+    invalid = (matrix == NOT_AN_OPTION).sum(axis=0)
+
+    return schemas.ItemAnalysis(
+        test_id=test_id,
+        students=students,
+        alpha=_optional(alpha),
+        questions=[
+            schemas.QuestionAnalysis(
+                question_id=question_id,
+                responses=int(responses[i]),
+                unanswered=int(students - responses[i]),
+                invalid=int(invalid[i]),
+                p_value=_optional(p_values[i]),
+                discrimination=_optional(discrimination[i]),
+                options=[
+                    schemas.OptionStats(
+                        option=option,
+                        correct=bool(option_index == key[i]),
+                        count=int(counts[i, option_index]),
+                        share=float(counts[i, option_index] / responses[i]) if responses[i] else 0.0,
+                        mean_score=_optional(mean_scores[i, option_index]),
+                    )
+                    for option_index, option in enumerate(options)
+                ],
+            )
+            for i, (question_id, options, _) in enumerate(questions)
+        ],
+    )
+
+async def get_item_analysis(db: AsyncSession, test_id: int):
+    result = await db.execute(
+        select(models.Question.id, models.Question.options, models.Question.correct_answer)
+        .where(models.Question.test_id == test_id)
+        .order_by(models.Question.id)
+    )
+    questions = [(question_id, options or [], correct_answer) for question_id, options, correct_answer in result.all()]
+    result = await db.execute(
+        select(models.UserResponse.user_id, models.UserResponse.question_id, models.UserResponse.selected_answer)
+        .join(models.Question, models.Question.id == models.UserResponse.question_id)
+        .where(models.Question.test_id == test_id)
+        .order_by(models.UserResponse.submitted_at, models.UserResponse.id)
+    )
+    rows = result.all()
+    user_ids, question_ids, answers = zip(*rows) if rows else ((), (), ())
+
+    def compute():
+        _, matrix, key = encode_responses(questions, user_ids, question_ids, answers)
+        return analyze(test_id, questions, matrix, key)
+
+    # The vectorized work runs without holding the event loop
+    return await asyncio.to_thread(compute)
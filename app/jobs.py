@@ -0,0 +1,98 @@
+"""
+# Redis-backed job queue shared by the API and the worker process (app/worker.py)
+"""
+
+from redis.asyncio import Redis
+from uuid import uuid4
+import json
+import os
+import time
+
+PDF_INGEST_QUEUE = "jobs:queue:pdf_ingest"
+FEEDBACK_QUEUE = "jobs:queue:feedback"
+JOB_TTL = int(os.getenv("JOB_TTL", str(7 * 24 * 3600)))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+# A running job whose lease is not renewed within this window is handed to another worker
+JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", "300"))
+
+def _job_key(job_id: str) -> str:
+    return f"jobs:{job_id}"
+
+def processing_queue(queue: str) -> str:
+    return f"{queue}:processing"
+
+async def create_job(redis: Redis, queue: str, payload: dict) -> dict:
+    job = {
+        "id": uuid4().hex,
+        "queue": queue,
+        "status": "queued",
+        "attempts": 0,
+        "errors": [],
+        "created_at": time.time(),
+        "lease_until": None,
+        **payload,
+    }
+    await save_job(redis, job)
+    await redis.lpush(queue, job["id"])
+    return job
+
+async def get_job(redis: Redis, job_id: str):
+    data = await redis.get(_job_key(job_id))
+    return json.loads(data) if data else None
+
+async def save_job(redis: Redis, job: dict):
+    await redis.set(_job_key(job["id"]), json.dumps(job), ex=JOB_TTL)
+
+async def renew_lease(redis: Redis, job: dict):
+    job["lease_until"] = time.time() + JOB_LEASE_SECONDS
+    await save_job(redis, job)
+
+async def claim_next(redis: Redis, queue: str, timeout: float):
+    job_id = await redis.blmove(queue, processing_queue(queue), timeout, "RIGHT", "LEFT")
+    if job_id is None:
+        return None
+    job = await get_job(redis, job_id.decode())
+    if job is None:
+        await redis.lrem(processing_queue(queue), 1, job_id)
+        return None
+    job["status"] = "running"
+    job["attempts"] += 1
+    await renew_lease(redis, job)
+    return job
+
+async def complete_job(redis: Redis, job: dict, **fields):
+    job.update(fields, status="done", lease_until=None)
+    await save_job(redis, job)
+    await redis.lrem(processing_queue(job["queue"]), 1, job["id"])
+
+async def fail_job(redis: Redis, job: dict, error: str):
+    """Record a failed attempt; the job is queued again until it runs out of attempts."""
+    job["errors"].append(error)
+    job["lease_until"] = None
+    job["status"] = "queued" if job["attempts"] < JOB_MAX_ATTEMPTS else "failed"
+    await save_job(redis, job)
+    # Zero removed means requeue_expired already put it back after the lease ran out
+    removed = await redis.lrem(processing_queue(job["queue"]), 1, job["id"])
+    if removed and job["status"] == "queued":
+        await redis.lpush(job["queue"], job["id"])
+
+async def requeue_expired(redis: Redis, queue: str):
+    """Put jobs whose lease ran out back on the queue; returns the ones that ran out of attempts instead."""
+    failed = []
+    for job_id in await redis.lrange(processing_queue(queue), 0, -1):
+        job = await get_job(redis, job_id.decode())
+        # lease_until is unset only in the instant between claiming a job and taking its lease
+        if job is None or (job["lease_until"] is not None and job["lease_until"] < time.time()):
+            # Only the consumer whose LREM takes the entry requeues it, so concurrent sweeps cannot double it
+            if await redis.lrem(processing_queue(queue), 1, job_id) and job is not None:
+                # A job that kills its worker (e.g. an out-of-memory PDF) only ever ends this way, so the
+                # attempt limit has to apply here too
+                job["errors"].append("Lease expired")
+                job["lease_until"] = None
+                job["status"] = "queued" if job["attempts"] < JOB_MAX_ATTEMPTS else "failed"
+                await save_job(redis, job)
+                if job["status"] == "queued":
+                    await redis.lpush(queue, job_id)
+                else:
+                    failed.append(job)
+    return failed
@@ -0,0 +1,45 @@
+from collections import OrderedDict
+import time
+
+class LRUCache:
+    """Size-bounded in-process LRU with an optional per-entry TTL.
+
+    Only touched from the event loop, so no locking is done.
+    """
+
+    def __init__(self, maxsize: int, ttl: float = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+
+    def get(self, key, default=None):
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+        value, expires_at = entry
+        if expires_at is not None and expires_at < time.monotonic():
+            del self._data[key]
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key, value):
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        self._data[key] = (value, expires_at)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key):
+        self._data.pop(key, None)
+
+    def clear(self):
+        self._data.clear()
+
+    def stats(self):
+        return {"size": len(self._data), "maxsize": self.maxsize, "hits": self.hits, "misses": self.misses}
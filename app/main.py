@@ -5,23 +5,56 @@
 
 
 
-from fastapi import FastAPI, Depends, HTTPException, status, File, Form, UploadFile
+from fastapi import FastAPI, Depends, HTTPException, status, File, Form, UploadFile, Request, Response, Query
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
-from typing import List
-import boto3
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+from pydantic import TypeAdapter
 from fastapi.middleware.cors import CORSMiddleware
-# from redis.asyncio import Redis
-from redis import Redis
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+from contextlib import asynccontextmanager
 from datetime import timedelta
 import os
-import json
-from . import models, schemas, crud, auth, pdf_processor, openai_service, assignments
-from .database import SessionLocal, engine
-from .models import TopicItemType
+import asyncio
+from uuid import uuid4
+from . import models, schemas, crud, auth, assignments, redis_client, cache, jobs, passwords, feedback_cache, gradebook
+from . import item_analysis, question_import
+from .database import async_engine, get_db
 from .redis_client import get_redis
-
-app = FastAPI(title="Learning Platform")
+from .storage import s3_client, S3_BUCKET_NAME
+from .query_counter import QueryBudgetMiddleware
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    redis_client.init_pool()
+    listener = asyncio.create_task(redis_client.listen())
+    yield
+    listener.cancel()
+    await redis_client.close_pool()
+    await async_engine.dispose()
+
+app = FastAPI(title="Learning Platform", lifespan=lifespan)
+
+# Worst-case queries per request (cold caches included); exceeding one usually means a lazy load per row
+QUERY_BUDGETS = {
+    "GET /topics": 2,
+    "GET /topics/{topic_id}": 2,
+    "GET /topics/{topic_id}/tests": 2,
+    "GET /tests/{test_id}/questions": 1,
+    "POST /tests/{test_id}/submit": 8,
+    "GET /tests/{test_id}/stats": 1,
+    "GET /tests/{test_id}/item-analysis": 2,
+    "GET /groups/{group_id}/gradebook": 2,
+    "GET /admin/users": 2,
+    "GET /admin/groups": 3,
+    "GET /assignments/independent/{assignment_id}/submissions": 2,
+    "POST /assignments/independent/{assignment_id}/grades/bulk": 3,
+}
+# "off", "warn" or "raise"; test runs should use "raise"
+QUERY_BUDGET_MODE = os.getenv("QUERY_BUDGET_MODE", "off")
+if QUERY_BUDGET_MODE != "off":
+    app.add_middleware(QueryBudgetMiddleware, budgets=QUERY_BUDGETS, mode=QUERY_BUDGET_MODE)
 
 app.add_middleware(
     CORSMiddleware,
@@ -31,22 +64,31 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-models.Base.metadata.create_all(bind=engine)
-
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
 
-def get_db():
-    db = SessionLocal()
+topic_list_adapter = TypeAdapter(List[schemas.Topic])
+topic_detail_adapter = TypeAdapter(schemas.TopicDetail)
+question_list_adapter = TypeAdapter(List[schemas.Question])
+test_list_adapter = TypeAdapter(List[schemas.Test])
+user_list_adapter = TypeAdapter(List[schemas.User])
+group_list_adapter = TypeAdapter(List[schemas.Group])
+item_analysis_adapter = TypeAdapter(schemas.ItemAnalysis)
+
+# List endpoints page by id: pass the last id of a page as `after` to get the next one
+PAGE_SIZE = int(os.getenv("PAGE_SIZE", "100"))
+MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", "500"))
+
+def get_projection(fields: Optional[str], model):
     try:
-        yield db
-    finally:
-        db.close()
-
-s3_client = boto3.client(
-    "s3",
-    aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
-    aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
-)
+        return schemas.parse_fields(fields, model)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def projection_key(include: Optional[set]) -> str:
+    return ",".join(sorted(include)) if include else "*"
+
+def list_include(include: Optional[set]):
+    return {"__all__": include} if include else None
 
 @app.get("/")
 async def root():
@@ -54,21 +96,26 @@ async def root():
 
 # Authentication
 @app.post("/register", response_model=schemas.User)
-async def register(user: schemas.UserCreate, db: Session = Depends(get_db)):
-    db_user = crud.get_user_by_email(db, email=user.email)
+async def register(user: schemas.UserCreate, db: AsyncSession = Depends(get_db)):
+    db_user = await crud.get_user_by_email(db, email=user.email)
     if db_user:
         raise HTTPException(status_code=400, detail="Email already registered")
-    return crud.create_user(db=db, user=user)
+    return await crud.create_user(db=db, user=user)
 
 @app.post("/login")
-async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    user = crud.get_user_by_email(db, email=form_data.username)
-    if not user or not auth.verify_password(form_data.password, user.hashed_password):
+async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_db)):
+    user = await crud.get_user_by_email(db, email=form_data.username)
+    is_valid, new_hash = (False, None)
+    if user:
+        is_valid, new_hash = await passwords.verify_password(form_data.password, user.hashed_password)
+    if not is_valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    if new_hash:
+        await crud.set_password_hash(db, user, new_hash)
     access_token_expires = timedelta(minutes=30)
     access_token = auth.create_access_token(
         data={"sub": user.email}, expires_delta=access_token_expires
@@ -76,249 +123,544 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session =
     return {"access_token": access_token, "token_type": "bearer"}
 
 @app.post("/logout")
-async def logout(token: str = Depends(oauth2_scheme), redis: Redis = Depends(get_redis)):
-    await redis.setex(f"blacklist:{token}", 1800, "true")
+async def logout(token: str = Depends(oauth2_scheme)):
+    if not await auth.revoke_token(token):
+        raise HTTPException(status_code=503, detail="Could not log out right now, try again")
     return {"message": "Successfully logged out"}
 
 # Topic Endpoints
 @app.get("/topics", response_model=List[schemas.Topic])
-async def get_topics(db: Session = Depends(get_db), redis: Redis = Depends(get_redis)):
-    cache_key = "topics_list"
-    cached_topics = await redis.get(cache_key)
-    if cached_topics:
-        data = json.loads(cached_topics)
-        return [schemas.Topic.model_validate(item) for item in data]
-    topics = crud.get_topics(db)
-    data = [topic.model_dump() for topic in topics]
-    await redis.setex(cache_key, 3600, json.dumps(data))
-    return topics
+async def get_topics(
+    request: Request,
+    limit: int = Query(PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[int] = None,
+    fields: Optional[str] = None,
+    db: AsyncSession = Depends(get_db),
+    redis: Redis = Depends(get_redis),
+):
+    include = get_projection(fields, schemas.Topic)
+    with_items = include is None or "items" in include
+    cached = await cache.get_or_load(
+        redis,
+        "topics",
+        f"list:{after}:{limit}:{projection_key(include)}",
+        topic_list_adapter,
+        lambda: crud.get_topics(db, limit, after, with_items),
+        include=list_include(include),
+    )
+    return cache.json_response(request, cached)
 
 @app.get("/topics/{topic_id}", response_model=schemas.TopicDetail)
-async def get_topic(topic_id: int, db: Session = Depends(get_db), redis: Redis = Depends(get_redis)):
-    cache_key = f"topic:{topic_id}"
-    cached_topic = await redis.get(cache_key)
-    if cached_topic:
-        return schemas.TopicDetail.model_validate(json.loads(cached_topic))
-    topic = crud.get_topic(db, topic_id)
-    if not topic:
+async def get_topic(
+    topic_id: int, request: Request, db: AsyncSession = Depends(get_db), redis: Redis = Depends(get_redis)
+):
+    cached = await cache.get_or_load(
+        redis, f"topic:{topic_id}", "detail", topic_detail_adapter, lambda: crud.get_topic(db, topic_id)
+    )
+    if cached is None:
         raise HTTPException(status_code=404, detail="Topic not found")
-    data = topic.model_dump()
-    await redis.setex(cache_key, 3600, json.dumps(data))
-    return topic
+    return cache.json_response(request, cached)
 
 @app.post("/admin/topics", response_model=schemas.Topic)
 async def create_topic(
     topic: schemas.TopicCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
+    redis: Redis = Depends(get_redis),
     current_user: schemas.User = Depends(auth.get_current_teacher_or_admin),
 ):
-    return crud.create_topic(db, topic)
+    db_topic = await crud.create_topic(db, topic)
+    await cache.bump(redis, "topics")
+    return db_topic
 
 @app.put("/admin/topics/{topic_id}", response_model=schemas.Topic)
 async def update_topic(
     topic_id: int,
     topic: schemas.TopicCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
+    redis: Redis = Depends(get_redis),
     current_user: schemas.User = Depends(auth.get_current_teacher_or_admin),
 ):
-    db_topic = crud.get_topic(db, topic_id)
+    db_topic = await crud.get_topic(db, topic_id)
     if not db_topic:
         raise HTTPException(status_code=404, detail="Topic not found")
-    return crud.update_topic(db, topic_id, topic)
+    db_topic = await crud.update_topic(db, topic_id, topic)
+    await cache.bump(redis, "topics", f"topic:{topic_id}")
+    return db_topic
 
 @app.delete("/admin/topics/{topic_id}")
 async def delete_topic(
     topic_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
+    redis: Redis = Depends(get_redis),
     current_user: schemas.User = Depends(auth.get_current_teacher_or_admin),
 ):
-    db_topic = crud.get_topic(db, topic_id)
+    db_topic = await crud.get_topic(db, topic_id)
     if not db_topic:
         raise HTTPException(status_code=404, detail="Topic not found")
-    crud.delete_topic(db, topic_id)
+    await crud.delete_topic(db, topic_id)
+    await cache.bump(redis, "topics", f"topic:{topic_id}", f"tests:{topic_id}")
     return {"message": "Topic deleted successfully"}
 
 @app.post("/admin/topics/{topic_id}/items")
 async def create_topic_item(
     topic_id: int,
     item: schemas.TopicItemCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
+    redis: Redis = Depends(get_redis),
     current_user: schemas.User = Depends(auth.get_current_teacher_or_admin),
 ):
     item.topic_id = topic_id
-    return crud.create_topic_item(db, item)
+    db_item = await crud.create_topic_item(db, item)
+    await cache.bump(redis, "topics", f"topic:{topic_id}")
+    return db_item
+
+@app.post("/admin/topics/{topic_id}/items/bulk", response_model=List[schemas.TopicItem])
+async def create_topic_items_bulk(
+    topic_id: int,
+    bulk: schemas.TopicItemBulkCreate,
+    db: AsyncSession = Depends(get_db),
+    redis: Redis = Depends(get_redis),
+    current_user: schemas.User = Depends(auth.get_current_teacher_or_admin),
+):
+    if not await crud.get_topic(db, topic_id, with_items=False):
+        raise HTTPException(status_code=404, detail="Topic not found")
+    db_items = await crud.create_topic_items(db, topic_id, bulk.items, bulk.order)
+    await cache.bump(redis, "topics", f"topic:{topic_id}")
+    return db_items
 
-@app.post("/admin/upload_pdf")
+@app.post("/admin/upload_pdf", response_model=schemas.PdfIngestJob, status_code=202)
 async def upload_pdf(
     file: UploadFile = File(...),
     topic_id: int = Form(...),
     order: int = Form(...),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
+    redis: Redis = Depends(get_redis),
     current_user: schemas.User = Depends(auth.get_current_teacher_or_admin),
 ):
+    if not await crud.get_topic(db, topic_id, with_items=False):
+        raise HTTPException(status_code=404, detail="Topic not found")
+    source_key = f"uploads/pdf/{uuid4()}.pdf"
     try:
-        image_urls = await pdf_processor.process_pdf(file, topic_id, s3_client)
-        for i, url in enumerate(image_urls, start=order):
-            crud.create_topic_item(
-                db,
-                schemas.TopicItemCreate(
-                    topic_id=topic_id,
-                    type=TopicItemType.image,
-                    content=url,
-                    order=i,
-                ),
-            )
-        return {"message": "PDF processed and images uploaded successfully"}
+        await asyncio.to_thread(s3_client.upload_fileobj, file.file, S3_BUCKET_NAME, source_key)
+        return await jobs.create_job(
+            redis,
+            jobs.PDF_INGEST_QUEUE,
+            {
+                "topic_id": topic_id,
+                "order": order,
+                "source_key": source_key,
+                "total_pages": 0,
+                "next_page": 1,
+                "pages_done": 0,
+                "item_ids": [],
+            },
+        )
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"PDF processing failed: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"PDF upload failed: {str(e)}")
+
+@app.get("/admin/jobs/{job_id}", response_model=schemas.PdfIngestJob)
+async def get_job(
+    job_id: str,
+    redis: Redis = Depends(get_redis),
+    current_user: schemas.User = Depends(auth.get_current_teacher_or_admin),
+):
+    job = await jobs.get_job(redis, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
 
 # Test Endpoints
 @app.get("/topics/{topic_id}/tests", response_model=List[schemas.Test])
-async def get_tests(topic_id: int, db: Session = Depends(get_db)):
-    tests = crud.get_tests_by_topic(db, topic_id)
-    return tests
+async def get_tests(
+    topic_id: int,
+    request: Request,
+    limit: int = Query(PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[int] = None,
+    fields: Optional[str] = None,
+    db: AsyncSession = Depends(get_db),
+    redis: Redis = Depends(get_redis),
+):
+    include = get_projection(fields, schemas.Test)
+    with_questions = include is None or "questions" in include
+    cached = await cache.get_or_load(
+        redis,
+        f"tests:{topic_id}",
+        f"list:{after}:{limit}:{projection_key(include)}",
+        test_list_adapter,
+        lambda: crud.get_tests_by_topic(db, topic_id, limit, after, with_questions),
+        include=list_include(include),
+    )
+    return cache.json_response(request, cached)
 
 @app.get("/tests/{test_id}/questions", response_model=List[schemas.Question])
-async def get_questions(test_id: int, db: Session = Depends(get_db), redis: Redis = Depends(get_redis)):
-    cache_key = f"questions:{test_id}"
-    cached_questions = await redis.get(cache_key)
-    if cached_questions:
-        data = json.loads(cached_questions)
-        return [schemas.Question.model_validate(item) for item in data]
-    questions = crud.get_questions_by_test(db, test_id)
-    data = [question.model_dump() for question in questions]
-    await redis.setex(cache_key, 3600, json.dumps(data))
-    return questions
+async def get_questions(
+    test_id: int, request: Request, db: AsyncSession = Depends(get_db), redis: Redis = Depends(get_redis)
+):
+    cached = await cache.get_or_load(
+        redis, f"questions:{test_id}", "list", question_list_adapter, lambda: crud.get_questions_by_test(db, test_id)
+    )
+    return cache.json_response(request, cached)
 
 @app.post("/tests/{test_id}/submit", response_model=schemas.TestResult)
 async def submit_test(
     test_id: int,
     submission: schemas.TestSubmission,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
+    redis: Redis = Depends(get_redis),
     current_user: schemas.User = Depends(auth.get_current_user),
 ):
-    # Save user responses
-    for answer in submission.answers:
-        crud.create_user_response(
-            db,
-            schemas.UserResponseCreate(
-                user_id=current_user.id,
-                question_id=answer.question_id,
-                selected_answer=answer.selected_answer,
-            ),
-        )
-    correct_count = crud.calculate_test_score(db, test_id, submission)
-    total_questions = len(crud.get_questions_by_test(db, test_id))
-    score = (correct_count / total_questions) * 100 if total_questions > 0 else 0
-    feedback = ""
-    can_proceed = score >= 60
-    if not can_proceed:
-        incorrect_answers = [answer for answer in submission.answers if not crud.is_answer_correct(db, answer)]
-        feedback = await openai_service.generate_feedback(
-            submission.topic_id, correct_count, total_questions, incorrect_answers, db
+    try:
+        grade = await crud.grade_submission(db, test_id, submission)
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    can_proceed = grade.score >= gradebook.PASS_SCORE
+    if can_proceed:
+        db_feedback = await crud.save_test_attempt(db, current_user, test_id, grade, submission.answers, "Good job!")
+    else:
+        # Feedback is generated by the worker; the client polls /feedback/{id} for it
+        db_feedback = await crud.save_test_attempt(
+            db, current_user, test_id, grade, submission.answers, feedback_status=models.FeedbackStatus.pending
         )
-    crud.create_feedback(
-        db,
-        schemas.FeedbackCreate(
-            user_id=current_user.id,
-            test_id=test_id,
-            feedback_text=feedback or "Good job!",
-        ),
-    )
+        try:
+            await jobs.create_job(
+                redis,
+                jobs.FEEDBACK_QUEUE,
+                {
+                    "feedback_id": db_feedback.id,
+                    "test_id": test_id,
+                    "topic_id": submission.topic_id,
+                    "correct_count": grade.correct_count,
+                    "total_questions": grade.total_questions,
+                    "incorrect_answers": [answer.model_dump() for answer in grade.incorrect_answers],
+                },
+            )
+        except RedisError:
+            await crud.set_feedback_result(db, db_feedback.id, models.FeedbackStatus.failed)
+            db_feedback.status = models.FeedbackStatus.failed
+    await cache.bump(redis, item_analysis.namespace(test_id))
     return schemas.TestResult(
-        correct_count=correct_count,
-        total_questions=total_questions,
-        score=score,
-        feedback=feedback or "Good job!",
+        correct_count=grade.correct_count,
+        total_questions=grade.total_questions,
+        score=grade.score,
+        feedback=db_feedback.feedback_text,
+        feedback_id=db_feedback.id,
+        feedback_status=db_feedback.status,
         can_proceed=can_proceed,
     )
 
+@app.get("/tests/{test_id}/stats", response_model=schemas.TestStats)
+async def get_test_stats(
+    test_id: int,
+    db: AsyncSession = Depends(get_db),
+    current_user: schemas.User = Depends(auth.get_current_teacher_or_admin),
+):
+    return await gradebook.get_test_stats(db, test_id)
+
+@app.get("/tests/{test_id}/item-analysis", response_model=schemas.ItemAnalysis)
+async def get_item_analysis(
+    test_id: int,
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+    redis: Redis = Depends(get_redis),
+    current_user: schemas.User = Depends(auth.get_current_teacher_or_admin),
+):
+    cached = await cache.get_or_load(
+        redis,
+        item_analysis.namespace(test_id),
+        "items",
+        item_analysis_adapter,
+        lambda: item_analysis.get_item_analysis(db, test_id),
+    )
+    return cache.json_response(request, cached, cache.PRIVATE_CACHE_CONTROL)
+
+@app.get("/groups/{group_id}/gradebook", response_model=List[schemas.GradebookRow])
+async def get_group_gradebook(
+    group_id: int,
+    test_id: Optional[int] = None,
+    limit: int = Query(PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[int] = None,
+    db: AsyncSession = Depends(get_db),
+    current_user: schemas.User = Depends(auth.get_current_teacher_or_admin),
+):
+    return await gradebook.get_group_gradebook(db, group_id, limit, after, test_id)
+
+@app.get("/feedback/{feedback_id}", response_model=schemas.Feedback)
+async def get_feedback(
+    feedback_id: int,
+    db: AsyncSession = Depends(get_db),
+    current_user: schemas.User = Depends(auth.get_current_user),
+):
+    db_feedback = await crud.get_feedback(db, feedback_id)
+    if not db_feedback:
+        raise HTTPException(status_code=404, detail="Feedback not found")
+    if db_feedback.user_id != current_user.id and current_user.role == models.UserRole.user:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    return db_feedback
+
 @app.post("/admin/tests", response_model=schemas.Test)
 async def create_test(
     test: schemas.TestCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
+    redis: Redis = Depends(get_redis),
+    current_user: schemas.User = Depends(auth.get_current_teacher_or_admin),
+):
+    db_test = await crud.create_test(db, test)
+    await cache.bump(redis, f"tests:{db_test.topic_id}")
+    return db_test
+
+@app.post("/admin/tests/import", response_model=schemas.ImportReport)
+async def import_tests(
+    file: UploadFile = File(...),
+    format: Optional[str] = Form(None),
+    db: AsyncSession = Depends(get_db),
+    redis: Redis = Depends(get_redis),
     current_user: schemas.User = Depends(auth.get_current_teacher_or_admin),
 ):
-    return crud.create_test(db, test)
+    try:
+        format = question_import.detect_format(file.filename, format)
+        report, touched = await question_import.import_questions(db, question_import.text_stream(file.file), format)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    await crud.invalidate_test_content(db, redis, *touched)
+    return report
 
 @app.post("/admin/questions", response_model=schemas.Question)
 async def create_question(
     question: schemas.QuestionCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
+    redis: Redis = Depends(get_redis),
     current_user: schemas.User = Depends(auth.get_current_teacher_or_admin),
 ):
-    return crud.create_question(db, question)
+    db_question = await crud.create_question(db, question)
+    await crud.invalidate_test_content(db, redis, db_question.test_id)
+    return db_question
+
+@app.put("/admin/questions/{question_id}", response_model=schemas.Question)
+async def update_question(
+    question_id: int,
+    question: schemas.QuestionUpdate,
+    db: AsyncSession = Depends(get_db),
+    redis: Redis = Depends(get_redis),
+    current_user: schemas.User = Depends(auth.get_current_teacher_or_admin),
+):
+    db_question = await crud.get_question(db, question_id)
+    if not db_question:
+        raise HTTPException(status_code=404, detail="Question not found")
+    old_test_id = db_question.test_id
+    db_question = await crud.update_question(db, question_id, question)
+    await crud.invalidate_test_content(db, redis, old_test_id, db_question.test_id)
+    return db_question
 
 # Assignment Endpoints
 @app.post("/assignments/practical", response_model=schemas.PracticalAssignment)
 async def create_practical_assignment(
     assignment: schemas.PracticalAssignmentCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: schemas.User = Depends(auth.get_current_teacher_or_admin),
 ):
-    return assignments.create_practical_assignment(db, assignment)
+    return await assignments.create_practical_assignment(db, assignment)
 
 @app.post("/assignments/independent", response_model=schemas.IndependentAssignment)
 async def create_independent_assignment(
     assignment: schemas.IndependentAssignmentCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: schemas.User = Depends(auth.get_current_teacher_or_admin),
 ):
-    return assignments.create_independent_assignment(db, assignment)
+    return await assignments.create_independent_assignment(db, assignment)
 
 @app.post("/assignments/independent/{assignment_id}/submit")
 async def submit_independent_assignment(
     assignment_id: int,
     file: UploadFile = File(...),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: schemas.User = Depends(auth.get_current_user),
 ):
-    file_url = await assignments.upload_assignment_file(file, assignment_id, s3_client)
-    return assignments.create_independent_submission(
+    if not await assignments.get_independent_assignment(db, assignment_id):
+        raise HTTPException(status_code=404, detail="Assignment not found")
+    file_url, file_checksum = await assignments.upload_assignment_file(file, assignment_id, s3_client)
+    return await assignments.create_independent_submission(
         db, schemas.IndependentSubmissionCreate(
             user_id=current_user.id,
             assignment_id=assignment_id,
             file_url=file_url,
+            file_checksum=file_checksum,
         )
     )
 
+# Direct-to-storage alternative to the multipart endpoint above: request a presigned POST, upload, then confirm
+@app.post("/assignments/independent/{assignment_id}/upload_url", response_model=schemas.AssignmentUploadTicket)
+async def create_assignment_upload_url(
+    assignment_id: int,
+    upload: schemas.AssignmentUploadRequest,
+    db: AsyncSession = Depends(get_db),
+    current_user: schemas.User = Depends(auth.get_current_user),
+):
+    if not await assignments.get_independent_assignment(db, assignment_id):
+        raise HTTPException(status_code=404, detail="Assignment not found")
+    return assignments.create_upload_ticket(assignment_id, current_user.id, upload, s3_client)
+
+@app.post("/assignments/independent/{assignment_id}/confirm_upload", response_model=schemas.IndependentSubmission)
+async def confirm_assignment_upload(
+    assignment_id: int,
+    confirm: schemas.AssignmentUploadConfirm,
+    db: AsyncSession = Depends(get_db),
+    current_user: schemas.User = Depends(auth.get_current_user),
+):
+    if not await assignments.get_independent_assignment(db, assignment_id):
+        raise HTTPException(status_code=404, detail="Assignment not found")
+    file_url = await assignments.confirm_uploaded_file(db, assignment_id, current_user.id, confirm.key, s3_client)
+    return await assignments.create_independent_submission(
+        db, schemas.IndependentSubmissionCreate(
+            user_id=current_user.id,
+            assignment_id=assignment_id,
+            file_url=file_url,
+        )
+    )
+
+@app.get("/assignments/independent/{assignment_id}/submissions", response_model=List[schemas.IndependentSubmissionReview])
+async def get_independent_submissions(
+    assignment_id: int,
+    ungraded: bool = False,
+    limit: int = Query(PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[int] = None,
+    db: AsyncSession = Depends(get_db),
+    current_user: schemas.User = Depends(auth.get_current_teacher_or_admin),
+):
+    rows = await assignments.get_independent_submissions(db, assignment_id, limit, after, ungraded)
+    download_urls = await asyncio.to_thread(
+        assignments.create_download_urls, [submission.file_url for submission, _ in rows], s3_client
+    )
+    return [
+        schemas.IndependentSubmissionReview(
+            **schemas.IndependentSubmission.model_validate(submission).model_dump(),
+            user_email=email,
+            download_url=download_url,
+        )
+        for (submission, email), download_url in zip(rows, download_urls)
+    ]
+
+@app.post("/assignments/independent/{assignment_id}/grades/bulk", response_model=schemas.BulkGradeResult)
+async def grade_independent_assignments(
+    assignment_id: int,
+    bulk: schemas.IndependentSubmissionBulkGrade,
+    db: AsyncSession = Depends(get_db),
+    current_user: schemas.User = Depends(auth.get_current_teacher_or_admin),
+):
+    graded = await assignments.grade_independent_submissions(db, assignment_id, bulk.grades)
+    return schemas.BulkGradeResult(assignment_id=assignment_id, graded=graded)
+
 @app.post("/assignments/independent/{submission_id}/grade")
 async def grade_independent_assignment(
     submission_id: int,
     grade: schemas.IndependentSubmissionGrade,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: schemas.User = Depends(auth.get_current_teacher_or_admin),
 ):
-    return assignments.grade_independent_submission(db, submission_id, grade)
+    return await assignments.grade_independent_submission(db, submission_id, grade)
 
 # Group Endpoints
 @app.post("/admin/groups", response_model=schemas.Group)
 async def create_group(
     group: schemas.GroupCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: schemas.User = Depends(auth.get_current_admin),
 ):
-    return crud.create_group(db, group)
+    return await crud.create_group(db, group)
+
+@app.get("/admin/groups", response_model=List[schemas.Group])
+async def get_groups(
+    limit: int = Query(PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[int] = None,
+    fields: Optional[str] = None,
+    db: AsyncSession = Depends(get_db),
+    current_user: schemas.User = Depends(auth.get_current_admin),
+):
+    include = get_projection(fields, schemas.Group)
+    groups = await crud.get_groups(db, limit, after, include is None or "users" in include)
+    body = cache.encode(group_list_adapter, groups, list_include(include)).body
+    return Response(content=body, media_type="application/json")
 
 @app.post("/admin/groups/{group_id}/users")
 async def add_user_to_group(
     group_id: int,
     user_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: schemas.User = Depends(auth.get_current_admin),
 ):
-    return crud.add_user_to_group(db, group_id, user_id)
+    db_user = await crud.add_user_to_group(db, group_id, user_id)
+    await auth.invalidate_principal(db_user.email)
+    return db_user
+
+@app.post("/admin/groups/{group_id}/users/bulk", response_model=schemas.GroupEnrollment)
+async def add_users_to_group(
+    group_id: int,
+    enrollment: schemas.GroupUsersBulk,
+    db: AsyncSession = Depends(get_db),
+    current_user: schemas.User = Depends(auth.get_current_admin),
+):
+    try:
+        moved = await crud.add_users_to_group(db, group_id, enrollment.user_ids)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    await auth.invalidate_principal(*(email for _, email in moved))
+    moved_ids = {user_id for user_id, _ in moved}
+    return schemas.GroupEnrollment(
+        group_id=group_id,
+        moved=sorted(moved_ids),
+        missing=sorted(set(enrollment.user_ids) - moved_ids),
+    )
 
 # Superadmin Endpoints
+@app.post("/admin/users/bulk", response_model=schemas.UserImportReport)
+async def create_users(
+    users: schemas.UserBulkCreate,
+    db: AsyncSession = Depends(get_db),
+    current_user: schemas.User = Depends(auth.get_current_admin),
+):
+    try:
+        results = await crud.create_users(db, users.users)
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    created = sum(result.id is not None for result in results)
+    return schemas.UserImportReport(created=created, error_count=len(results) - created, results=results)
+
 @app.get("/admin/users", response_model=List[schemas.User])
-async def get_users(db: Session = Depends(get_db), current_user: schemas.User = Depends(auth.get_current_admin)):
-    return crud.get_users(db)
+async def get_users(
+    limit: int = Query(PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[int] = None,
+    fields: Optional[str] = None,
+    db: AsyncSession = Depends(get_db),
+    current_user: schemas.User = Depends(auth.get_current_admin),
+):
+    include = get_projection(fields, schemas.User)
+    users = await crud.get_users(db, limit, after)
+    body = cache.encode(user_list_adapter, users, list_include(include)).body
+    return Response(content=body, media_type="application/json")
 
 @app.put("/admin/users/{user_id}", response_model=schemas.User)
 async def update_user(
     user_id: int,
     user: schemas.UserUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: schemas.User = Depends(auth.get_current_admin),
 ):
-    return crud.update_user(db, user_id, user)
\ No newline at end of file
+    db_user = await crud.get_user(db, user_id)
+    if not db_user:
+        raise HTTPException(status_code=404, detail="User not found")
+    old_email = db_user.email
+    db_user = await crud.update_user(db, user_id, user)
+    await auth.invalidate_principal(old_email, db_user.email)
+    return db_user
+
+# Internal Endpoints
+@app.get("/internal/stats")
+async def get_internal_stats(current_user: schemas.User = Depends(auth.get_current_admin)):
+    return {
+        "redis": redis_client.pool_stats(),
+        "answer_keys": crud.answer_keys.stats(),
+        "principals": auth.principals.stats(),
+        "passwords": passwords.stats(),
+        "feedback_cache": await feedback_cache.stats(redis_client.get_redis()),
+    }
\ No newline at end of file
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, Enum, JSON, DateTime, Float
+from sqlalchemy import Column, Integer, String, ForeignKey, Enum, JSON, DateTime, Float, Index
 from sqlalchemy.orm import relationship
 from .database import Base
 import enum
@@ -15,13 +15,18 @@ class TopicItemType(str, enum.Enum):
     pdf = "pdf"
     video = "video"
 
+class FeedbackStatus(str, enum.Enum):
+    pending = "pending"
+    ready = "ready"
+    failed = "failed"
+
 class User(Base):
     __tablename__ = "users"
     id = Column(Integer, primary_key=True, index=True)
     email = Column(String, unique=True, index=True)
     hashed_password = Column(String)
     role = Column(Enum(UserRole), default=UserRole.user)
-    group_id = Column(Integer, ForeignKey("groups.id"), nullable=True)
+    group_id = Column(Integer, ForeignKey("groups.id"), nullable=True, index=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     responses = relationship("UserResponse", back_populates="user")
     feedback = relationship("Feedback", back_populates="user")
@@ -47,6 +52,7 @@ class Topic(Base):
 
 class TopicItem(Base):
     __tablename__ = "topic_items"
+    __table_args__ = (Index("ix_topic_items_topic_id_order", "topic_id", "order"),)
     id = Column(Integer, primary_key=True, index=True)
     topic_id = Column(Integer, ForeignKey("topics.id"))
     type = Column(Enum(TopicItemType))
@@ -57,7 +63,7 @@ class TopicItem(Base):
 class Test(Base):
     __tablename__ = "tests"
     id = Column(Integer, primary_key=True, index=True)
-    topic_id = Column(Integer, ForeignKey("topics.id"))
+    topic_id = Column(Integer, ForeignKey("topics.id"), index=True)
     title = Column(String)
     topic = relationship("Topic", back_populates="tests")
     questions = relationship("Question", back_populates="test")
@@ -66,7 +72,7 @@ class Test(Base):
 class Question(Base):
     __tablename__ = "questions"
     id = Column(Integer, primary_key=True, index=True)
-    test_id = Column(Integer, ForeignKey("tests.id"))
+    test_id = Column(Integer, ForeignKey("tests.id"), index=True)
     question_text = Column(String)
     options = Column(JSON)
     correct_answer = Column(String)
@@ -75,9 +81,10 @@ class Question(Base):
 
 class UserResponse(Base):
     __tablename__ = "user_responses"
+    __table_args__ = (Index("ix_user_responses_user_id_submitted_at", "user_id", "submitted_at"),)
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
-    question_id = Column(Integer, ForeignKey("questions.id"))
+    question_id = Column(Integer, ForeignKey("questions.id"), index=True)
     selected_answer = Column(String)
     submitted_at = Column(DateTime, default=datetime.utcnow)
     user = relationship("User", back_populates="responses")
@@ -86,9 +93,10 @@ class UserResponse(Base):
 class Feedback(Base):
     __tablename__ = "feedback"
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"))
-    test_id = Column(Integer, ForeignKey("tests.id"))
-    feedback_text = Column(String)
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
+    test_id = Column(Integer, ForeignKey("tests.id"), index=True)
+    feedback_text = Column(String, nullable=True)
+    status = Column(Enum(FeedbackStatus), default=FeedbackStatus.ready)
     created_at = Column(DateTime, default=datetime.utcnow)
     user = relationship("User", back_populates="feedback")
     test = relationship("Test", back_populates="feedback")
@@ -114,10 +122,32 @@ class IndependentSubmission(Base):
     __tablename__ = "independent_submissions"
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
-    assignment_id = Column(Integer, ForeignKey("independent_assignments.id"))
+    assignment_id = Column(Integer, ForeignKey("independent_assignments.id"), index=True)
     file_url = Column(String)
+    file_checksum = Column(String, nullable=True)  # SHA-256 hex digest of the uploaded file
     score = Column(Float, nullable=True)
     feedback = Column(String, nullable=True)
     submitted_at = Column(DateTime, default=datetime.utcnow)
     user = relationship("User", back_populates="submissions")
-    assignment = relationship("IndependentAssignment", back_populates="submissions")
\ No newline at end of file
+    assignment = relationship("IndependentAssignment", back_populates="submissions")
+
+# Rollups maintained by gradebook.record_attempt in the same transaction as the attempt itself
+class GradebookEntry(Base):
+    __tablename__ = "gradebook_entries"
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    test_id = Column(Integer, ForeignKey("tests.id"), primary_key=True)
+    best_score = Column(Float, nullable=False)
+    last_score = Column(Float, nullable=False)
+    attempts = Column(Integer, nullable=False)
+    last_attempt_at = Column(DateTime, nullable=False)
+
+class GroupTestStats(Base):
+    __tablename__ = "group_test_stats"
+    # test_id leads so per-test stats are a prefix scan
+    test_id = Column(Integer, ForeignKey("tests.id"), primary_key=True)
+    group_id = Column(Integer, ForeignKey("groups.id"), primary_key=True)
+    students = Column(Integer, nullable=False)
+    attempts = Column(Integer, nullable=False)
+    passed_students = Column(Integer, nullable=False)
+    score_total = Column(Float, nullable=False)
+    best_score_total = Column(Float, nullable=False)
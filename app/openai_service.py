@@ -1,26 +1,55 @@
 from openai import AsyncOpenAI
 import os
-from . import schemas, crud
-from sqlalchemy.orm import Session
+from . import schemas
 
-async def generate_feedback(topic_id: int, correct_count: int, total_questions: int, incorrect_answers: list, db: Session):
-    client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-    topic = crud.get_topic(db, topic_id)
+# "openai" in production; "fake" returns canned text so tests and local runs need no API key.
+# A provider takes the prompt and returns (feedback_text, tokens_used).
+FEEDBACK_PROVIDER = os.getenv("FEEDBACK_PROVIDER", "openai")
+FEEDBACK_MODEL = os.getenv("FEEDBACK_MODEL", "gpt-4o")
+FEEDBACK_TIMEOUT = float(os.getenv("FEEDBACK_TIMEOUT", "30"))
+FEEDBACK_MAX_RETRIES = int(os.getenv("FEEDBACK_MAX_RETRIES", "2"))
+
+_client = None
+
+def get_client() -> AsyncOpenAI:
+    global _client
+    if _client is None:
+        _client = AsyncOpenAI(
+            api_key=os.getenv("OPENAI_API_KEY"), timeout=FEEDBACK_TIMEOUT, max_retries=FEEDBACK_MAX_RETRIES
+        )
+    return _client
+
+async def openai_completion(prompt: str) -> str:
+    response = await get_client().chat.completions.create(
+        model=FEEDBACK_MODEL,
+        messages=[
+            {"role": "system", "content": "You are a helpful tutor providing constructive feedback."},
+            {"role": "user", "content": prompt},
+        ],
+    )
+    tokens = response.usage.total_tokens if response.usage else 0
+    return response.choices[0].message.content, tokens
+
+async def fake_completion(prompt: str):
+    return "Review the questions you missed and revisit the related topic material.", 0
+
+PROVIDERS = {
+    "openai": openai_completion,
+    "fake": fake_completion,
+}
+
+def build_prompt(topic_title: str, correct_count: int, total_questions: int, incorrect_answers: list) -> str:
     incorrect_details = [
         f"Question ID {answer.question_id}: Selected {answer.selected_answer}"
         for answer in incorrect_answers
     ]
-    prompt = f"""
-    The user took a test on the topic '{topic.title}'.
+    return f"""
+    The user took a test on the topic '{topic_title}'.
     They answered {correct_count} out of {total_questions} questions correctly (score: {(correct_count/total_questions)*100:.2f}%).
     Incorrect answers: {', '.join(incorrect_details)}.
     Provide feedback on their mistakes and suggest topics to review.
     """
-    response = await client.chat.completions.create(
-        model="gpt-4o",
-        messages=[
-            {"role": "system", "content": "You are a helpful tutor providing constructive feedback."},
-            {"role": "user", "content": prompt},
-        ],
-    )
-    return response.choices[0].message.content
\ No newline at end of file
+
+async def generate_feedback(topic_title: str, correct_count: int, total_questions: int, incorrect_answers: list):
+    prompt = build_prompt(topic_title, correct_count, total_questions, incorrect_answers)
+    return await PROVIDERS[FEEDBACK_PROVIDER](prompt)
@@ -0,0 +1,69 @@
+"""
+# bcrypt hashing off the event loop, with admission control
+"""
+
+from fastapi import HTTPException, status
+from concurrent.futures import ThreadPoolExecutor
+from passlib.context import CryptContext
+import asyncio
+import os
+
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+# bcrypt releases the GIL, so threads hash in parallel
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "4"))
+# Operations allowed to run or wait at once; beyond this callers get 429 instead of queueing
+PASSWORD_HASH_QUEUE = int(os.getenv("PASSWORD_HASH_QUEUE", "64"))
+PASSWORD_RETRY_AFTER = os.getenv("PASSWORD_RETRY_AFTER", "1")
+# Workers a bulk import may occupy at once, so logins still find a free one
+PASSWORD_BULK_WORKERS = int(os.getenv("PASSWORD_BULK_WORKERS", str(max(1, PASSWORD_HASH_WORKERS // 2))))
+
+# Pinning min/max rounds to the configured cost makes hashes with any other cost "need update"
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+    bcrypt__max_rounds=BCRYPT_ROUNDS,
+)
+_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt")
+_in_flight = 0
+_bulk_slots = asyncio.Semaphore(PASSWORD_BULK_WORKERS)
+
+async def _run(fn, *args):
+    global _in_flight
+    if _in_flight >= PASSWORD_HASH_QUEUE:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many requests, please retry shortly",
+            headers={"Retry-After": PASSWORD_RETRY_AFTER},
+        )
+    _in_flight += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_executor, fn, *args)
+    finally:
+        _in_flight -= 1
+
+async def hash_password(password: str) -> str:
+    return await _run(pwd_context.hash, password)
+
+async def hash_passwords(passwords: list) -> list:
+    """Hash a batch for an admin import: no 429s, but at most PASSWORD_BULK_WORKERS threads at a time."""
+    loop = asyncio.get_running_loop()
+
+    async def hash_one(password: str) -> str:
+        async with _bulk_slots:
+            return await loop.run_in_executor(_executor, pwd_context.hash, password)
+
+    return await asyncio.gather(*(hash_one(password) for password in passwords))
+
+async def verify_password(password: str, hashed_password: str):
+    """Return (is_valid, new_hash); new_hash is set when the stored hash uses an outdated cost."""
+    return await _run(pwd_context.verify_and_update, password, hashed_password)
+
+def stats():
+    return {
+        "in_flight": _in_flight,
+        "limit": PASSWORD_HASH_QUEUE,
+        "workers": PASSWORD_HASH_WORKERS,
+        "bulk_workers": PASSWORD_BULK_WORKERS,
+    }
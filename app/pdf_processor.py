@@ -1,30 +1,73 @@
-from fastapi import UploadFile
+from collections import deque
 import pdf2image
-from PIL import Image
-import io
-import boto3
+import asyncio
 import os
+import tempfile
 from uuid import uuid4
+from .storage import object_url
 
-async def process_pdf(file: UploadFile, topic_id: int, s3_client) -> list:
-    pdf_data = await file.read()
-    images = pdf2image.convert_from_bytes(pdf_data, dpi=100)
-    image_urls = []
+PDF_DPI = int(os.getenv("PDF_DPI", "100"))
+# Pages rasterized per pdftoppm call
+PDF_RENDER_BATCH = int(os.getenv("PDF_RENDER_BATCH", "4"))
+# Upper bound on pages rendered but not yet uploaded; this caps temp disk and memory use
+PDF_PAGES_IN_FLIGHT = int(os.getenv("PDF_PAGES_IN_FLIGHT", "16"))
+PDF_RENDER_WORKERS = int(os.getenv("PDF_RENDER_WORKERS", str(os.cpu_count() or 2)))
+PDF_UPLOAD_CONCURRENCY = int(os.getenv("PDF_UPLOAD_CONCURRENCY", "8"))
+
+def count_pages(pdf_path: str) -> int:
+    return pdf2image.pdfinfo_from_path(pdf_path)["Pages"]
+
+def _render_range(pdf_path: str, first_page: int, last_page: int, output_folder: str) -> list:
+    # pdftoppm runs as its own process and writes PNGs straight to disk, so no page is held as a PIL image
+    return pdf2image.convert_from_path(
+        pdf_path,
+        dpi=PDF_DPI,
+        first_page=first_page,
+        last_page=last_page,
+        output_folder=output_folder,
+        output_file=f"p{first_page}-",
+        fmt="png",
+        paths_only=True,
+    )
+
+async def iter_page_images(pdf_path: str, topic_id: int, s3_client, first_page: int = 1, total_pages: int = None):
+    """Rasterize and upload pages in order, yielding (page_number, image_url) as each page is stored."""
+    if total_pages is None:
+        total_pages = await asyncio.to_thread(count_pages, pdf_path)
     bucket_name = os.getenv("S3_BUCKET_NAME", "your-bucket-name")
+    render_slots = asyncio.Semaphore(PDF_RENDER_WORKERS)
+    upload_slots = asyncio.Semaphore(PDF_UPLOAD_CONCURRENCY)
+    batch = max(1, min(PDF_RENDER_BATCH, PDF_PAGES_IN_FLIGHT))
+    ranges_in_flight = max(1, PDF_PAGES_IN_FLIGHT // batch)
+
+    with tempfile.TemporaryDirectory() as workdir:
+
+        async def upload_page(page: int, path: str) -> str:
+            file_key = f"topics/{topic_id}/page_{page}_{uuid4()}.png"
+            async with upload_slots:
+                await asyncio.to_thread(
+                    s3_client.upload_file, path, bucket_name, file_key, ExtraArgs={"ContentType": "image/png"}
+                )
+            os.remove(path)
+            return object_url(bucket_name, file_key)
+
+        async def process_range(first: int, last: int) -> list:
+            async with render_slots:
+                paths = await asyncio.to_thread(_render_range, pdf_path, first, last, workdir)
+            return await asyncio.gather(*(upload_page(page, path) for page, path in zip(range(first, last + 1), paths)))
 
-    for i, image in enumerate(images):
-        img_byte_arr = io.BytesIO()
-        image.save(img_byte_arr, format="PNG", quality=85)
-        img_byte_arr = img_byte_arr.getvalue()
-
-        file_key = f"topics/{topic_id}/page_{i+1}_{uuid4()}.png"
-        s3_client.put_object(
-            Bucket=bucket_name,
-            Key=file_key,
-            Body=img_byte_arr,
-            ContentType="image/png",
-        )
-        image_url = f"https://{bucket_name}.s3.amazonaws.com/{file_key}"
-        image_urls.append(image_url)
-
-    return image_urls
\ No newline at end of file
+        pending = deque()
+        next_page = first_page
+        try:
+            while next_page <= total_pages or pending:
+                while next_page <= total_pages and len(pending) < ranges_in_flight:
+                    last = min(next_page + batch - 1, total_pages)
+                    pending.append((next_page, asyncio.create_task(process_range(next_page, last))))
+                    next_page = last + 1
+                first, task = pending.popleft()
+                for page, url in enumerate(await task, start=first):
+                    yield page, url
+        finally:
+            for _, task in pending:
+                task.cancel()
+            await asyncio.gather(*(task for _, task in pending), return_exceptions=True)
@@ -0,0 +1,68 @@
+"""
+# SQL statement counting and per-endpoint query budgets, used to catch N+1 regressions
+"""
+
+from contextlib import contextmanager
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+import contextvars
+import logging
+
+logger = logging.getLogger("app.query_counter")
+
+_statements = contextvars.ContextVar("query_counter_statements", default=None)
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _record_statement(conn, cursor, statement, parameters, context, executemany):
+    statements = _statements.get()
+    if statements is not None:
+        statements.append(statement)
+
+@contextmanager
+def count_queries():
+    """Collect the SQL statements executed in the current context (AsyncSession greenlets inherit it)."""
+    statements = []
+    token = _statements.set(statements)
+    try:
+        yield statements
+    finally:
+        _statements.reset(token)
+
+@contextmanager
+def query_budget(limit: int):
+    with count_queries() as statements:
+        yield statements
+    if len(statements) > limit:
+        raise QueryBudgetExceeded(f"{len(statements)} queries executed, budget is {limit}:\n" + "\n".join(statements))
+
+class QueryBudgetMiddleware:
+    """Counts queries per request and checks them against `budgets` ("METHOD /route/{param}" -> max queries).
+
+    mode is "warn" to log overruns or "raise" to fail the request, which is what tests should use.
+    """
+
+    def __init__(self, app, budgets: dict, mode: str = "warn"):
+        self.app = app
+        self.budgets = budgets
+        self.mode = mode
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        with count_queries() as statements:
+            await self.app(scope, receive, send)
+        route = scope.get("route")
+        if route is None:
+            return
+        endpoint = f"{scope['method']} {route.path}"
+        budget = self.budgets.get(endpoint)
+        if budget is None or len(statements) <= budget:
+            return
+        message = f"{endpoint} executed {len(statements)} queries, budget is {budget}"
+        if self.mode == "raise":
+            raise QueryBudgetExceeded(message + ":\n" + "\n".join(statements))
+        logger.warning(message)
@@ -1,9 +1,109 @@
-from redis.asyncio import Redis
+from redis.asyncio import Redis, BlockingConnectionPool
+from redis.exceptions import RedisError
+import asyncio
 import os
+import time
+
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379")
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", "50"))
+REDIS_TIMEOUT = float(os.getenv("REDIS_TIMEOUT", "0.5"))
+REDIS_HEALTH_CHECK_INTERVAL = int(os.getenv("REDIS_HEALTH_CHECK_INTERVAL", "30"))
+# After a failure Redis is bypassed for this many seconds instead of being retried on every request
+REDIS_RETRY_AFTER = float(os.getenv("REDIS_RETRY_AFTER", "5"))
+
+pool = None
+_unavailable_until = 0.0
+_failures = 0
+_subscribers = {}
+
+def init_pool():
+    global pool
+    pool = BlockingConnectionPool.from_url(
+        REDIS_URL,
+        max_connections=REDIS_MAX_CONNECTIONS,
+        timeout=REDIS_TIMEOUT,
+        socket_timeout=REDIS_TIMEOUT,
+        socket_connect_timeout=REDIS_TIMEOUT,
+        health_check_interval=REDIS_HEALTH_CHECK_INTERVAL,
+    )
+    return pool
+
+async def close_pool():
+    global pool
+    if pool is not None:
+        await pool.disconnect()
+        pool = None
 
 def get_redis():
-    redis = Redis.from_url(os.getenv("REDIS_URL", "redis://localhost:6379"))
+    if pool is None:
+        init_pool()
+    return Redis(connection_pool=pool)
+
+def is_available():
+    return time.monotonic() >= _unavailable_until
+
+def mark_unavailable():
+    global _unavailable_until, _failures
+    _failures += 1
+    _unavailable_until = time.monotonic() + REDIS_RETRY_AFTER
+
+async def safe_execute(redis: Redis, command: str, *args, default=None, **kwargs):
+    """Run a Redis command, returning `default` instead of raising when Redis is slow or down."""
+    if not is_available():
+        return default
     try:
-        yield redis
-    finally:
-        redis.close()
\ No newline at end of file
+        return await asyncio.wait_for(getattr(redis, command)(*args, **kwargs), REDIS_TIMEOUT)
+    except (RedisError, asyncio.TimeoutError, OSError):
+        mark_unavailable()
+        return default
+
+async def cache_get(redis: Redis, key: str):
+    return await safe_execute(redis, "get", key)
+
+async def cache_setex(redis: Redis, key: str, ttl: int, value) -> bool:
+    return bool(await safe_execute(redis, "setex", key, ttl, value, default=False))
+
+async def publish(channel: str, message) -> bool:
+    return await safe_execute(get_redis(), "publish", channel, message) is not None
+
+def subscribe(channel: str, on_message, on_resync=None):
+    """Register handlers for a pub/sub channel served by listen().
+
+    on_resync runs every time the subscription is (re)established, since
+    messages published while disconnected are lost.
+    """
+    _subscribers.setdefault(channel, []).append((on_message, on_resync))
+
+async def listen():
+    while True:
+        # Dedicated connection: the shared pool's socket timeout would end an idle subscription
+        redis = Redis.from_url(REDIS_URL, socket_connect_timeout=REDIS_TIMEOUT, health_check_interval=REDIS_HEALTH_CHECK_INTERVAL)
+        pubsub = redis.pubsub(ignore_subscribe_messages=True)
+        try:
+            await pubsub.subscribe(*_subscribers)
+            for handlers in _subscribers.values():
+                for _, on_resync in handlers:
+                    if on_resync is not None:
+                        await on_resync()
+            async for message in pubsub.listen():
+                data = message["data"].decode()
+                for on_message, _ in _subscribers.get(message["channel"].decode(), []):
+                    await on_message(data)
+        except (RedisError, OSError):
+            await asyncio.sleep(REDIS_RETRY_AFTER)
+        finally:
+            await pubsub.aclose()
+            await redis.aclose()
+
+def pool_stats():
+    stats = {
+        "max_connections": REDIS_MAX_CONNECTIONS,
+        "available": is_available(),
+        "failures": _failures,
+        "connections_idle": 0,
+        "connections_in_use": 0,
+    }
+    if pool is not None:
+        stats["connections_idle"] = len(pool._available_connections)
+        stats["connections_in_use"] = len(pool._in_use_connections)
+    return stats
@@ -1,7 +1,17 @@
-from pydantic import BaseModel, EmailStr, ConfigDict
-from typing import List, Optional
+from pydantic import BaseModel, EmailStr, ConfigDict, Field
+from typing import Dict, List, Optional
 from datetime import datetime
-from .models import UserRole, TopicItemType
+from .models import UserRole, TopicItemType, FeedbackStatus
+
+def parse_fields(fields: Optional[str], model) -> Optional[set]:
+    """Parse a `fields=a,b` projection; None means all fields. `id` is always kept as the page cursor."""
+    if not fields:
+        return None
+    requested = {field.strip() for field in fields.split(",") if field.strip()}
+    unknown = requested - set(model.model_fields)
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}")
+    return requested | {"id"}
 
 class UserBase(BaseModel):
     email: EmailStr
@@ -11,6 +21,20 @@ class UserBase(BaseModel):
 class UserCreate(UserBase):
     password: str
 
+class UserBulkCreate(BaseModel):
+    users: List[UserCreate] = Field(min_length=1, max_length=1000)
+
+class UserImportRow(BaseModel):
+    row: int
+    email: str
+    id: Optional[int] = None
+    error: Optional[str] = None
+
+class UserImportReport(BaseModel):
+    created: int
+    error_count: int
+    results: List[UserImportRow]
+
 class UserUpdate(BaseModel):
     email: Optional[EmailStr] = None
     role: Optional[UserRole] = None
@@ -22,9 +46,25 @@ class User(UserBase):
 
     model_config = ConfigDict(from_attributes = True)
 
+class Principal(BaseModel):
+    id: int
+    email: str
+    role: UserRole
+    group_id: Optional[int] = None
+
+    model_config = ConfigDict(from_attributes = True)
+
 class GroupBase(BaseModel):
     name: str
 
+class GroupUsersBulk(BaseModel):
+    user_ids: List[int] = Field(min_length=1, max_length=5000)
+
+class GroupEnrollment(BaseModel):
+    group_id: int
+    moved: List[int]
+    missing: List[int]
+
 class GroupCreate(GroupBase):
     pass
 
@@ -48,6 +88,24 @@ class TopicItem(TopicItemBase):
 
     model_config = ConfigDict(from_attributes = True)
 
+class TopicItemBulkEntry(BaseModel):
+    type: TopicItemType
+    content: str
+
+class TopicItemBulkCreate(BaseModel):
+    order: Optional[int] = None
+    items: List[TopicItemBulkEntry] = Field(min_length=1, max_length=1000)
+
+class PdfIngestJob(BaseModel):
+    id: str
+    status: str
+    attempts: int
+    errors: List[str]
+    topic_id: int
+    total_pages: int
+    pages_done: int
+    item_ids: List[int]
+
 class TopicBase(BaseModel):
     title: str
     description: str
@@ -74,11 +132,27 @@ class QuestionBase(BaseModel):
 class QuestionCreate(QuestionBase):
     pass
 
+class QuestionUpdate(BaseModel):
+    test_id: Optional[int] = None
+    question_text: Optional[str] = None
+    options: Optional[List[str]] = None
+    correct_answer: Optional[str] = None
+
 class Question(QuestionBase):
     id: int
 
     model_config = ConfigDict(from_attributes = True)
 
+class ImportRowError(BaseModel):
+    line: int
+    error: str
+
+class ImportReport(BaseModel):
+    tests_created: int = 0
+    questions_created: int = 0
+    error_count: int = 0
+    errors: List[ImportRowError] = []  # the first IMPORT_MAX_ERRORS of them
+
 class TestBase(BaseModel):
     topic_id: int
     title: str
@@ -100,13 +174,70 @@ class TestSubmission(BaseModel):
     topic_id: int
     answers: List[Answer]
 
+class TestGrade(BaseModel):
+    correct_count: int
+    total_questions: int
+    score: float
+    incorrect_answers: List[Answer]
+
 class TestResult(BaseModel):
     correct_count: int
     total_questions: int
     score: float
-    feedback: str
+    feedback: Optional[str] = None
+    feedback_id: int
+    feedback_status: FeedbackStatus
     can_proceed: bool
 
+class GradebookEntry(BaseModel):
+    test_id: int
+    best_score: float
+    last_score: float
+    attempts: int
+    last_attempt_at: datetime
+
+    model_config = ConfigDict(from_attributes = True)
+
+class GradebookRow(BaseModel):
+    user_id: int
+    email: str
+    entries: List[GradebookEntry]
+
+class GroupTestStats(BaseModel):
+    group_id: int
+    group_name: str
+    students: int
+    attempts: int
+    passed_students: int
+    average_score: float
+    average_best_score: float
+
+class TestStats(BaseModel):
+    test_id: int
+    groups: List[GroupTestStats]
+
+class OptionStats(BaseModel):
+    option: str
+    correct: bool
+    count: int
+    share: float
+    mean_score: Optional[float] = None  # mean total score of the students who picked it
+
+class QuestionAnalysis(BaseModel):
+    question_id: int
+    responses: int
+    unanswered: int
+    invalid: int  # answers that are not among the current options
+    p_value: Optional[float] = None
+    discrimination: Optional[float] = None
+    options: List[OptionStats]
+
+class ItemAnalysis(BaseModel):
+    test_id: int
+    students: int
+    alpha: Optional[float] = None
+    questions: List[QuestionAnalysis]
+
 class UserResponseBase(BaseModel):
     user_id: int
     question_id: int
@@ -124,13 +255,14 @@ class UserResponse(UserResponseBase):
 class FeedbackBase(BaseModel):
     user_id: int
     test_id: int
-    feedback_text: str
+    feedback_text: Optional[str] = None
 
 class FeedbackCreate(FeedbackBase):
     pass
 
 class Feedback(FeedbackBase):
     id: int
+    status: FeedbackStatus
     created_at: datetime
 
     model_config = ConfigDict(from_attributes = True)
@@ -165,10 +297,25 @@ class IndependentSubmissionBase(BaseModel):
     user_id: int
     assignment_id: int
     file_url: str
+    file_checksum: Optional[str] = None
 
 class IndependentSubmissionCreate(IndependentSubmissionBase):
     pass
 
+class AssignmentUploadRequest(BaseModel):
+    filename: str
+    content_type: str
+    size: int = Field(gt=0)
+
+class AssignmentUploadTicket(BaseModel):
+    key: str
+    url: str
+    fields: Dict[str, str]
+    expires_in: int
+
+class AssignmentUploadConfirm(BaseModel):
+    key: str
+
 class IndependentSubmissionGrade(BaseModel):
     score: float
     feedback: Optional[str] = None
@@ -179,4 +326,18 @@ class IndependentSubmission(IndependentSubmissionBase):
     feedback: Optional[str] = None
     submitted_at: datetime
 
-    model_config = ConfigDict(from_attributes = True)
\ No newline at end of file
+    model_config = ConfigDict(from_attributes = True)
+
+class IndependentSubmissionReview(IndependentSubmission):
+    user_email: str
+    download_url: Optional[str] = None
+
+class IndependentSubmissionGradeEntry(IndependentSubmissionGrade):
+    submission_id: int
+
+class IndependentSubmissionBulkGrade(BaseModel):
+    grades: List[IndependentSubmissionGradeEntry] = Field(min_length=1, max_length=1000)
+
+class BulkGradeResult(BaseModel):
+    assignment_id: int
+    graded: int
\ No newline at end of file
@@ -0,0 +1,19 @@
+import boto3
+import os
+
+S3_BUCKET_NAME = os.getenv("S3_BUCKET_NAME", "your-bucket-name")
+# Points the client at a local S3-compatible server (e.g. MinIO) in development
+S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL")
+
+s3_client = boto3.client(
+    "s3",
+    aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
+    aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
+    endpoint_url=S3_ENDPOINT_URL,
+)
+
+def object_url(bucket_name: str, key: str) -> str:
+    # Path-style on a custom endpoint, which MinIO serves without wildcard DNS; virtual-hosted on AWS
+    if S3_ENDPOINT_URL:
+        return f"{S3_ENDPOINT_URL.rstrip('/')}/{bucket_name}/{key}"
+    return f"https://{bucket_name}.s3.amazonaws.com/{key}"
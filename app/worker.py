@@ -0,0 +1,139 @@
+"""
+# Background worker: python -m app.worker
+"""
+
+from redis.asyncio import Redis
+import asyncio
+import logging
+import os
+import tempfile
+from . import crud, schemas, jobs, pdf_processor, cache, openai_service, feedback_cache
+from .database import AsyncSessionLocal
+from .models import TopicItemType, FeedbackStatus
+from .redis_client import REDIS_URL
+from .storage import s3_client, S3_BUCKET_NAME
+
+logger = logging.getLogger("app.worker")
+
+WORKER_POLL_TIMEOUT = float(os.getenv("WORKER_POLL_TIMEOUT", "5"))
+# Pages inserted per bulk topic-item insert
+PDF_ITEM_BATCH = int(os.getenv("PDF_ITEM_BATCH", "16"))
+PDF_INGEST_CONCURRENCY = int(os.getenv("PDF_INGEST_CONCURRENCY", "1"))
+# Feedback generations in flight per worker process
+FEEDBACK_CONCURRENCY = int(os.getenv("FEEDBACK_CONCURRENCY", "8"))
+
+async def process_pdf_ingest(redis: Redis, job: dict):
+    fd, pdf_path = tempfile.mkstemp(suffix=".pdf")
+    os.close(fd)
+    try:
+        await asyncio.to_thread(s3_client.download_file, S3_BUCKET_NAME, job["source_key"], pdf_path)
+        if not job["total_pages"]:
+            job["total_pages"] = await asyncio.to_thread(pdf_processor.count_pages, pdf_path)
+        async with AsyncSessionLocal() as db:
+
+            async def flush(pages: list):
+                # Each batch goes right after the pages already inserted, pushing later items down
+                db_items = await crud.create_topic_items(
+                    db,
+                    job["topic_id"],
+                    [schemas.TopicItemBulkEntry(type=TopicItemType.image, content=url) for _, url in pages],
+                    order=job["order"] + job["pages_done"],
+                )
+                job["item_ids"].extend(db_item.id for db_item in db_items)
+                job["pages_done"] += len(pages)
+                job["next_page"] = pages[-1][0] + 1
+                await jobs.renew_lease(redis, job)
+
+            pages = []
+            async for page, url in pdf_processor.iter_page_images(
+                pdf_path, job["topic_id"], s3_client, first_page=job["next_page"], total_pages=job["total_pages"]
+            ):
+                pages.append((page, url))
+                if len(pages) >= PDF_ITEM_BATCH:
+                    await flush(pages)
+                    pages = []
+            if pages:
+                await flush(pages)
+        await cache.bump(redis, "topics", f"topic:{job['topic_id']}")
+    finally:
+        os.remove(pdf_path)
+    await asyncio.to_thread(s3_client.delete_object, Bucket=S3_BUCKET_NAME, Key=job["source_key"])
+    await jobs.complete_job(redis, job)
+
+async def fail_feedback(job: dict):
+    async with AsyncSessionLocal() as db:
+        await crud.set_feedback_result(db, job["feedback_id"], FeedbackStatus.failed)
+
+async def process_feedback(redis: Redis, job: dict):
+    incorrect_answers = [schemas.Answer(**answer) for answer in job["incorrect_answers"]]
+
+    async def generate():
+        # The session is closed before the provider call, which would otherwise keep it idle in transaction
+        async with AsyncSessionLocal() as db:
+            topic = await crud.get_topic(db, job["topic_id"], with_items=False)
+        if topic is None:
+            raise ValueError(f"Topic {job['topic_id']} not found")
+        return await asyncio.wait_for(
+            openai_service.generate_feedback(
+                topic.title, job["correct_count"], job["total_questions"], incorrect_answers
+            ),
+            openai_service.FEEDBACK_TIMEOUT * (openai_service.FEEDBACK_MAX_RETRIES + 1),
+        )
+
+    try:
+        feedback_text = await feedback_cache.get_or_generate(
+            redis,
+            job["test_id"],
+            job["topic_id"],
+            job["correct_count"],
+            job["total_questions"],
+            incorrect_answers,
+            generate,
+        )
+    except Exception:
+        if job["attempts"] >= jobs.JOB_MAX_ATTEMPTS:
+            await fail_feedback(job)
+        raise
+    async with AsyncSessionLocal() as db:
+        await crud.set_feedback_result(db, job["feedback_id"], FeedbackStatus.ready, feedback_text)
+    await jobs.complete_job(redis, job)
+
+# queue -> (handler, consumers per worker process)
+HANDLERS = {
+    jobs.PDF_INGEST_QUEUE: (process_pdf_ingest, PDF_INGEST_CONCURRENCY),
+    jobs.FEEDBACK_QUEUE: (process_feedback, FEEDBACK_CONCURRENCY),
+}
+# Run for jobs whose lease expired on their last attempt, which no handler gets to clean up after
+EXPIRED_HANDLERS = {
+    jobs.FEEDBACK_QUEUE: fail_feedback,
+}
+
+async def consume(redis: Redis, queue: str):
+    handler, _ = HANDLERS[queue]
+    while True:
+        for job in await jobs.requeue_expired(redis, queue):
+            logger.error("Job %s failed: its lease expired on every attempt", job["id"])
+            if queue in EXPIRED_HANDLERS:
+                await EXPIRED_HANDLERS[queue](job)
+        job = await jobs.claim_next(redis, queue, WORKER_POLL_TIMEOUT)
+        if job is None:
+            continue
+        try:
+            await handler(redis, job)
+        except Exception as e:
+            logger.exception("Job %s failed", job["id"])
+            await jobs.fail_job(redis, job, str(e))
+
+async def main():
+    # Own client without the API pool's short socket timeout, which would cut blocking pops short
+    redis = Redis.from_url(REDIS_URL)
+    try:
+        await asyncio.gather(
+            *(consume(redis, queue) for queue, (_, consumers) in HANDLERS.items() for _ in range(consumers))
+        )
+    finally:
+        await redis.aclose()
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
@@ -0,0 +1,57 @@
+"""
+# Cache hit latency: pre-serialized bytes vs. json.loads -> model_validate -> re-encode
+
+    python -m benchmarks.bench_cache_hit [items]
+"""
+
+from datetime import datetime
+from typing import List
+import json
+import sys
+import timeit
+from pydantic import TypeAdapter
+from starlette.requests import Request
+from app import cache, schemas
+
+def build_topic(items: int) -> dict:
+    return {
+        "id": 1,
+        "title": "Algebra",
+        "description": "Linear equations",
+        "created_at": datetime(2025, 1, 1).isoformat(),
+        "items": [
+            {
+                "id": i,
+                "topic_id": 1,
+                "type": "image",
+                "content": f"https://bucket.s3.amazonaws.com/topics/1/page_{i}.png",
+                "order": i,
+            }
+            for i in range(items)
+        ],
+    }
+
+def main():
+    items = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    topic = build_topic(items)
+    adapter = TypeAdapter(List[schemas.Topic])
+    legacy_raw = json.dumps([topic])
+    cached_raw = cache._pack(cache.encode(adapter, [topic]))
+
+    def legacy_hit():
+        models = [schemas.Topic.model_validate(item) for item in json.loads(legacy_raw)]
+        # FastAPI then validates and encodes again through response_model
+        return adapter.dump_json(adapter.validate_python(models, from_attributes=True))
+
+    request = Request({"type": "http", "headers": []})
+
+    def bytes_hit():
+        return cache.json_response(request, cache._unpack(cached_raw)[1])
+
+    for name, fn in (("json.loads + model_validate", legacy_hit), ("pre-serialized bytes", bytes_hit)):
+        number = 200
+        best = min(timeit.repeat(fn, number=number, repeat=5)) / number
+        print(f"{name:<30} {best * 1e6:10.1f} us/hit  ({items} items)")
+
+if __name__ == "__main__":
+    main()
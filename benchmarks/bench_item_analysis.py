@@ -0,0 +1,91 @@
+"""
+# Item analysis over a test's responses: NumPy response matrix vs. per-response Python loops
+
+    python -m benchmarks.bench_item_analysis [students] [questions]
+"""
+
+import math
+import random
+import sys
+import time
+from app import item_analysis
+
+OPTIONS = ["A", "B", "C", "D"]
+
+def build_responses(students: int, questions: int):
+    rng = random.Random(7)
+    bank = [(question_id, OPTIONS, rng.choice(OPTIONS)) for question_id in range(1, questions + 1)]
+    user_ids, question_ids, answers = [], [], []
+    for user_id in range(1, students + 1):
+        ability = rng.random()
+        for question_id, options, correct_answer in bank:
+            if rng.random() < 0.03:
+                continue
+            user_ids.append(user_id)
+            question_ids.append(question_id)
+            answers.append(correct_answer if rng.random() < ability else rng.choice(options))
+    return bank, user_ids, question_ids, answers
+
+def loop_analysis(bank, user_ids, question_ids, answers):
+    # The straightforward version: dicts keyed by student and question, statistics summed per item
+    correct_answers = {question_id: correct_answer for question_id, _, correct_answer in bank}
+    sheets = {}
+    for user_id, question_id, answer in zip(user_ids, question_ids, answers):
+        sheets.setdefault(user_id, {}).setdefault(question_id, answer)
+    totals = {
+        user_id: sum(answer == correct_answers[question_id] for question_id, answer in sheet.items())
+        for user_id, sheet in sheets.items()
+    }
+    n = len(sheets)
+    results = []
+    item_variance = 0.0
+    for question_id, options, correct_answer in bank:
+        scores = [int(sheet.get(question_id) == correct_answer) for sheet in sheets.values()]
+        rests = [totals[user_id] - score for user_id, score in zip(sheets, scores)]
+        answered = sum(question_id in sheet for sheet in sheets.values())
+        mean_x, mean_r = sum(scores) / n, sum(rests) / n
+        cov = sum(x * r for x, r in zip(scores, rests)) / n - mean_x * mean_r
+        sd_x = math.sqrt(sum((x - mean_x) ** 2 for x in scores) / n)
+        sd_r = math.sqrt(sum((r - mean_r) ** 2 for r in rests) / n)
+        counts = {option: 0 for option in options}
+        for sheet in sheets.values():
+            if sheet.get(question_id) in counts:
+                counts[sheet[question_id]] += 1
+        item_variance += sd_x ** 2
+        results.append((sum(scores) / answered, cov / (sd_x * sd_r) if sd_x and sd_r else None, counts))
+    mean_total = sum(totals.values()) / n
+    total_variance = sum((t - mean_total) ** 2 for t in totals.values()) / n
+    alpha = len(bank) / (len(bank) - 1) * (1 - item_variance / total_variance)
+    return results, alpha
+
+def vectorized_analysis(bank, user_ids, question_ids, answers):
+    _, matrix, key = item_analysis.encode_responses(bank, user_ids, question_ids, answers)
+    return item_analysis.analyze(1, bank, matrix, key)
+
+def best_of(fn, *args, repeat=3):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(*args)
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+def main():
+    students = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    questions = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    bank, user_ids, question_ids, answers = build_responses(students, questions)
+    loop_time, (loop_items, loop_alpha) = best_of(loop_analysis, bank, user_ids, question_ids, answers)
+    numpy_time, analysis = best_of(vectorized_analysis, bank, user_ids, question_ids, answers)
+
+    assert math.isclose(analysis.alpha, loop_alpha, rel_tol=1e-9)
+    for item, (p_value, discrimination, counts) in zip(analysis.questions, loop_items):
+        assert math.isclose(item.p_value, p_value, rel_tol=1e-9)
+        assert math.isclose(item.discrimination, discrimination, rel_tol=1e-9)
+        assert {option.option: option.count for option in item.options} == counts
+
+    print(f"{len(user_ids)} responses, {students} students x {questions} questions, alpha {analysis.alpha:.3f}")
+    for name, seconds in (("python loops", loop_time), ("numpy matrix", numpy_time)):
+        print(f"{name:<14} {seconds * 1e3:10.1f} ms")
+
+if __name__ == "__main__":
+    main()
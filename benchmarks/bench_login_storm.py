@@ -0,0 +1,58 @@
+"""
+# Latency of other requests during a login storm: bcrypt on the event loop vs. the bounded executor
+
+    python -m benchmarks.bench_login_storm [logins]
+
+A probe coroutine stands in for a cheap endpoint and measures how long each
+of its iterations actually takes while the logins are being verified.
+"""
+
+import asyncio
+import statistics
+import sys
+import time
+from fastapi import HTTPException
+from app import passwords
+
+PROBE_INTERVAL = 0.005
+
+async def probe(latencies: list, stop: asyncio.Event):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(PROBE_INTERVAL)
+        latencies.append(time.perf_counter() - start - PROBE_INTERVAL)
+
+async def inline_login(hashed: str):
+    passwords.pwd_context.verify("correct horse", hashed)
+
+async def executor_login(hashed: str):
+    try:
+        await passwords.verify_password("correct horse", hashed)
+    except HTTPException:
+        return "rejected"
+
+async def storm(login, logins: int, hashed: str):
+    latencies = []
+    stop = asyncio.Event()
+    probe_task = asyncio.create_task(probe(latencies, stop))
+    start = time.perf_counter()
+    results = await asyncio.gather(*(login(hashed) for _ in range(logins)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await probe_task
+    latencies.sort()
+    p99 = latencies[int(len(latencies) * 0.99) - 1] if latencies else float("nan")
+    rejected = results.count("rejected")
+    print(
+        f"{login.__name__:<15} logins={logins} rejected={rejected} wall={elapsed:.2f}s "
+        f"probe p50={statistics.median(latencies) * 1000:.1f}ms p99={p99 * 1000:.1f}ms"
+    )
+
+def main():
+    logins = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    hashed = passwords.pwd_context.hash("correct horse")
+    asyncio.run(storm(inline_login, logins, hashed))
+    asyncio.run(storm(executor_login, logins, hashed))
+
+if __name__ == "__main__":
+    main()
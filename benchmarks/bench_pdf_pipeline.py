@@ -0,0 +1,73 @@
+"""
+# PDF rasterization: peak memory and throughput on a synthetic multi-hundred-page PDF
+
+    python -m benchmarks.bench_pdf_pipeline [pages] [--legacy]
+
+Uploads go to a stand-in S3 client that only reads the file, so the numbers
+cover rasterization, encoding and pipeline overhead. Run each mode in a
+fresh process: ru_maxrss is a high-water mark.
+"""
+
+from PIL import Image, ImageDraw
+import asyncio
+import io
+import os
+import resource
+import sys
+import tempfile
+import time
+import pdf2image
+from app import pdf_processor
+
+class NullS3:
+    def upload_file(self, path, bucket, key, ExtraArgs=None):
+        with open(path, "rb") as f:
+            while f.read(1024 * 1024):
+                pass
+
+    def put_object(self, Bucket, Key, Body, ContentType=None):
+        pass
+
+def build_pdf(path: str, pages: int):
+    def page(i):
+        image = Image.new("RGB", (1240, 1754), "white")
+        ImageDraw.Draw(image).text((100, 100), f"Page {i + 1}", fill="black")
+        return image
+
+    first = page(0)
+    first.save(path, save_all=True, append_images=(page(i) for i in range(1, pages)), resolution=150)
+
+async def run_pipeline(pdf_path: str) -> int:
+    count = 0
+    async for _ in pdf_processor.iter_page_images(pdf_path, 1, NullS3()):
+        count += 1
+    return count
+
+def run_legacy(pdf_path: str) -> int:
+    with open(pdf_path, "rb") as f:
+        images = pdf2image.convert_from_bytes(f.read(), dpi=pdf_processor.PDF_DPI)
+    s3 = NullS3()
+    for image in images:
+        buf = io.BytesIO()
+        image.save(buf, format="PNG")
+        s3.put_object(Bucket="bench", Key="page.png", Body=buf.getvalue())
+    return len(images)
+
+def main():
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    pages = int(args[0]) if args else 300
+    legacy = "--legacy" in sys.argv
+    with tempfile.TemporaryDirectory() as workdir:
+        pdf_path = os.path.join(workdir, "synthetic.pdf")
+        build_pdf(pdf_path, pages)
+        baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        start = time.perf_counter()
+        done = run_legacy(pdf_path) if legacy else asyncio.run(run_pipeline(pdf_path))
+        elapsed = time.perf_counter() - start
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(f"mode={'legacy' if legacy else 'pipeline'} pages={done}")
+    print(f"throughput: {done / elapsed:.1f} pages/s ({elapsed:.1f}s)")
+    print(f"peak RSS growth: {(peak - baseline) / 1024:.1f} MiB")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""baseline schema
+
+Matches what Base.metadata.create_all produced before migrations were
+introduced. Existing databases should be stamped with this revision
+(`alembic stamp 0001`) and then upgraded.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+user_role = sa.Enum("user", "teacher", "superadmin", name="userrole")
+topic_item_type = sa.Enum("text", "image", "pdf", "video", name="topicitemtype")
+
+def upgrade():
+    op.create_table(
+        "groups",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("name", sa.String()),
+    )
+    op.create_index("ix_groups_id", "groups", ["id"])
+    op.create_index("ix_groups_name", "groups", ["name"])
+
+    op.create_table(
+        "users",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("email", sa.String()),
+        sa.Column("hashed_password", sa.String()),
+        sa.Column("role", user_role),
+        sa.Column("group_id", sa.Integer(), sa.ForeignKey("groups.id"), nullable=True),
+        sa.Column("created_at", sa.DateTime()),
+    )
+    op.create_index("ix_users_id", "users", ["id"])
+    op.create_index("ix_users_email", "users", ["email"], unique=True)
+
+    op.create_table(
+        "topics",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("title", sa.String()),
+        sa.Column("description", sa.String()),
+        sa.Column("created_at", sa.DateTime()),
+    )
+    op.create_index("ix_topics_id", "topics", ["id"])
+    op.create_index("ix_topics_title", "topics", ["title"])
+
+    op.create_table(
+        "topic_items",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("topic_id", sa.Integer(), sa.ForeignKey("topics.id")),
+        sa.Column("type", topic_item_type),
+        sa.Column("content", sa.String()),
+        sa.Column("order", sa.Integer()),
+    )
+    op.create_index("ix_topic_items_id", "topic_items", ["id"])
+
+    op.create_table(
+        "tests",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("topic_id", sa.Integer(), sa.ForeignKey("topics.id")),
+        sa.Column("title", sa.String()),
+    )
+    op.create_index("ix_tests_id", "tests", ["id"])
+
+    op.create_table(
+        "questions",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("test_id", sa.Integer(), sa.ForeignKey("tests.id")),
+        sa.Column("question_text", sa.String()),
+        sa.Column("options", sa.JSON()),
+        sa.Column("correct_answer", sa.String()),
+    )
+    op.create_index("ix_questions_id", "questions", ["id"])
+
+    op.create_table(
+        "user_responses",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id")),
+        sa.Column("question_id", sa.Integer(), sa.ForeignKey("questions.id")),
+        sa.Column("selected_answer", sa.String()),
+        sa.Column("submitted_at", sa.DateTime()),
+    )
+    op.create_index("ix_user_responses_id", "user_responses", ["id"])
+
+    op.create_table(
+        "feedback",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id")),
+        sa.Column("test_id", sa.Integer(), sa.ForeignKey("tests.id")),
+        sa.Column("feedback_text", sa.String()),
+        sa.Column("created_at", sa.DateTime()),
+    )
+    op.create_index("ix_feedback_id", "feedback", ["id"])
+
+    op.create_table(
+        "practical_assignments",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("topic_id", sa.Integer(), sa.ForeignKey("topics.id")),
+        sa.Column("title", sa.String()),
+        sa.Column("description", sa.String()),
+    )
+    op.create_index("ix_practical_assignments_id", "practical_assignments", ["id"])
+
+    op.create_table(
+        "independent_assignments",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("group_id", sa.Integer(), sa.ForeignKey("groups.id")),
+        sa.Column("title", sa.String()),
+        sa.Column("description", sa.String()),
+    )
+    op.create_index("ix_independent_assignments_id", "independent_assignments", ["id"])
+
+    op.create_table(
+        "independent_submissions",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id")),
+        sa.Column("assignment_id", sa.Integer(), sa.ForeignKey("independent_assignments.id")),
+        sa.Column("file_url", sa.String()),
+        sa.Column("score", sa.Float(), nullable=True),
+        sa.Column("feedback", sa.String(), nullable=True),
+        sa.Column("submitted_at", sa.DateTime()),
+    )
+    op.create_index("ix_independent_submissions_id", "independent_submissions", ["id"])
+
+def downgrade():
+    op.drop_table("independent_submissions")
+    op.drop_table("independent_assignments")
+    op.drop_table("practical_assignments")
+    op.drop_table("feedback")
+    op.drop_table("user_responses")
+    op.drop_table("questions")
+    op.drop_table("tests")
+    op.drop_table("topic_items")
+    op.drop_table("topics")
+    op.drop_table("users")
+    op.drop_table("groups")
+    topic_item_type.drop(op.get_bind(), checkfirst=True)
+    user_role.drop(op.get_bind(), checkfirst=True)
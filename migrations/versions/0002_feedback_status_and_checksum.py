@@ -0,0 +1,27 @@
+"""feedback status and submission checksum
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+feedback_status = sa.Enum("pending", "ready", "failed", name="feedbackstatus")
+
+def upgrade():
+    feedback_status.create(op.get_bind(), checkfirst=True)
+    # Rows written before background generation all carry their text already.
+    op.add_column("feedback", sa.Column("status", feedback_status, server_default="ready"))
+    op.add_column("independent_submissions", sa.Column("file_checksum", sa.String(), nullable=True))
+
+def downgrade():
+    op.drop_column("independent_submissions", "file_checksum")
+    op.drop_column("feedback", "status")
+    feedback_status.drop(op.get_bind(), checkfirst=True)
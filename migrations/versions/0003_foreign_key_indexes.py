@@ -0,0 +1,38 @@
+"""indexes for foreign keys and hot lookups
+
+topic_items(topic_id, order) serves both the per-topic item list and the
+order shift on bulk insert; user_responses(user_id, submitted_at) serves a
+user's attempt history. Both lead with the FK column, so no separate
+single-column index is created for it.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18
+"""
+
+from alembic import op
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ("ix_users_group_id", "users", ["group_id"]),
+    ("ix_topic_items_topic_id_order", "topic_items", ["topic_id", "order"]),
+    ("ix_tests_topic_id", "tests", ["topic_id"]),
+    ("ix_questions_test_id", "questions", ["test_id"]),
+    ("ix_user_responses_user_id_submitted_at", "user_responses", ["user_id", "submitted_at"]),
+    ("ix_user_responses_question_id", "user_responses", ["question_id"]),
+    ("ix_feedback_user_id", "feedback", ["user_id"]),
+    ("ix_feedback_test_id", "feedback", ["test_id"]),
+    ("ix_independent_submissions_assignment_id", "independent_submissions", ["assignment_id"]),
+]
+
+def upgrade():
+    for name, table, columns in INDEXES:
+        op.create_index(name, table, columns)
+
+def downgrade():
+    for name, table, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
@@ -0,0 +1,42 @@
+"""gradebook rollups
+
+Created empty; fill them from existing responses with
+`python -m app.gradebook backfill`.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        "gradebook_entries",
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), primary_key=True),
+        sa.Column("test_id", sa.Integer(), sa.ForeignKey("tests.id"), primary_key=True),
+        sa.Column("best_score", sa.Float(), nullable=False),
+        sa.Column("last_score", sa.Float(), nullable=False),
+        sa.Column("attempts", sa.Integer(), nullable=False),
+        sa.Column("last_attempt_at", sa.DateTime(), nullable=False),
+    )
+    op.create_table(
+        "group_test_stats",
+        sa.Column("test_id", sa.Integer(), sa.ForeignKey("tests.id"), primary_key=True),
+        sa.Column("group_id", sa.Integer(), sa.ForeignKey("groups.id"), primary_key=True),
+        sa.Column("students", sa.Integer(), nullable=False),
+        sa.Column("attempts", sa.Integer(), nullable=False),
+        sa.Column("passed_students", sa.Integer(), nullable=False),
+        sa.Column("score_total", sa.Float(), nullable=False),
+        sa.Column("best_score_total", sa.Float(), nullable=False),
+    )
+
+def downgrade():
+    op.drop_table("group_test_stats")
+    op.drop_table("gradebook_entries")
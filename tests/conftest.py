@@ -0,0 +1,57 @@
+import os
+import tempfile
+
+# The app reads its settings at import time
+_db_path = os.path.join(tempfile.mkdtemp(prefix="learning-platform-tests-"), "test.db")
+os.environ.update(
+    DATABASE_URL=f"sqlite:///{_db_path}",
+    ASYNC_DATABASE_URL=f"sqlite+aiosqlite:///{_db_path}",
+    QUERY_BUDGET_MODE="raise",
+    BCRYPT_ROUNDS="4",
+    FEEDBACK_PROVIDER="fake",
+    S3_BUCKET_NAME="learning-platform-test",
+    AWS_ACCESS_KEY_ID="testing",
+    AWS_SECRET_ACCESS_KEY="testing",
+    AWS_DEFAULT_REGION="us-east-1",
+)
+
+import fakeredis
+import pytest
+from fastapi.testclient import TestClient
+from app import auth, crud, feedback_cache, main, models, redis_client
+from app.database import engine
+
+@pytest.fixture
+def redis(monkeypatch):
+    fake = fakeredis.FakeAsyncRedis()
+    # Keyed on the function the endpoints depend on, before monkeypatch replaces the module attribute
+    main.app.dependency_overrides[redis_client.get_redis] = lambda: fake
+    monkeypatch.setattr(redis_client, "get_redis", lambda: fake)
+    yield fake
+    main.app.dependency_overrides.clear()
+
+@pytest.fixture
+def client(redis):
+    models.Base.metadata.drop_all(bind=engine)
+    models.Base.metadata.create_all(bind=engine)
+    for local_cache in (auth.principals, crud.answer_keys, feedback_cache.local_entries):
+        local_cache.clear()
+    # Not entered as a context manager: the lifespan would open a real Redis pool
+    return TestClient(main.app)
+
+def ok(response, status_code=200):
+    assert response.status_code == status_code, response.text
+    return response.json()
+
+def register(client, email, role="user", group_id=None):
+    response = client.post(
+        "/register", json={"email": email, "password": "secret", "role": role, "group_id": group_id}
+    )
+    assert response.status_code == 200, response.text
+    response = client.post("/login", data={"username": email, "password": "secret"})
+    assert response.status_code == 200, response.text
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+@pytest.fixture
+def admin(client):
+    return register(client, "admin@example.com", role="superadmin")
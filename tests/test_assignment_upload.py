@@ -0,0 +1,107 @@
+import asyncio
+import hashlib
+import io
+import os
+import boto3
+import pytest
+from fastapi import HTTPException, UploadFile
+from moto import mock_aws
+from starlette.datastructures import Headers
+from app import assignments, main
+from conftest import ok, register
+
+BUCKET = os.environ["S3_BUCKET_NAME"]
+MB = 1024 * 1024
+
+@pytest.fixture
+def s3():
+    with mock_aws():
+        client = boto3.client("s3", region_name="us-east-1")
+        client.create_bucket(Bucket=BUCKET)
+        yield client
+
+def upload(data: bytes, s3_client, filename="report.pdf"):
+    # size=None, as for chunked request bodies, so the limit is enforced while streaming
+    file = UploadFile(io.BytesIO(data), filename=filename, headers=Headers({"content-type": "application/pdf"}))
+    return asyncio.run(assignments.upload_assignment_file(file, 7, s3_client))
+
+def stored_key(file_url: str) -> str:
+    return assignments._key_from_url(file_url, BUCKET)
+
+class FailingParts:
+    # Delegates to the real client but fails the nth part upload
+    def __init__(self, client, fail_on: int):
+        self.client = client
+        self.fail_on = fail_on
+
+    def upload_part(self, **kwargs):
+        if kwargs["PartNumber"] == self.fail_on:
+            raise ConnectionError("connection reset")
+        return self.client.upload_part(**kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+def test_small_file_is_stored_with_one_put(s3, monkeypatch):
+    monkeypatch.setattr(s3, "create_multipart_upload", None)
+    data = b"%PDF small file"
+    file_url, digest = upload(data, s3)
+    key = stored_key(file_url)
+    assert key.startswith("assignments/7/") and key.endswith("_report.pdf")
+    stored = s3.get_object(Bucket=BUCKET, Key=key)
+    assert stored["Body"].read() == data
+    assert stored["ContentType"] == "application/pdf"
+    assert digest == hashlib.sha256(data).hexdigest()
+
+def test_large_file_is_streamed_in_parts(s3):
+    data = os.urandom(12 * MB)
+    file_url, digest = upload(data, s3)
+    stored = s3.get_object(Bucket=BUCKET, Key=stored_key(file_url))
+    # A multipart ETag ends in the part count: an 8 MiB part and the remaining 4 MiB
+    assert stored["ETag"].endswith('-2"')
+    assert stored["Body"].read() == data
+    assert digest == hashlib.sha256(data).hexdigest()
+
+def test_upload_over_the_limit_is_rejected_and_aborted(s3, monkeypatch):
+    monkeypatch.setattr(assignments, "ASSIGNMENT_MAX_UPLOAD_BYTES", 10 * MB)
+    with pytest.raises(HTTPException) as error:
+        upload(os.urandom(12 * MB), s3)
+    assert error.value.status_code == 413
+    # The first part had already gone up; the multipart upload must not be left behind
+    assert s3.list_multipart_uploads(Bucket=BUCKET).get("Uploads", []) == []
+    assert s3.list_objects_v2(Bucket=BUCKET)["KeyCount"] == 0
+
+def test_declared_size_over_the_limit_is_rejected_before_reading(s3, monkeypatch):
+    monkeypatch.setattr(assignments, "ASSIGNMENT_MAX_UPLOAD_BYTES", MB)
+    file = UploadFile(io.BytesIO(b""), size=2 * MB, filename="report.pdf")
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(assignments.upload_assignment_file(file, 7, s3))
+    assert error.value.status_code == 413
+
+def test_failed_part_aborts_the_multipart_upload(s3):
+    with pytest.raises(ConnectionError):
+        upload(os.urandom(12 * MB), FailingParts(s3, fail_on=2))
+    assert s3.list_multipart_uploads(Bucket=BUCKET).get("Uploads", []) == []
+    assert s3.list_objects_v2(Bucket=BUCKET)["KeyCount"] == 0
+
+def test_direct_upload_is_confirmed_once_for_an_existing_assignment(client, admin, s3, monkeypatch):
+    # The app's client was created before moto started
+    monkeypatch.setattr(main, "s3_client", s3)
+    group = ok(client.post("/admin/groups", json={"name": "Group A"}, headers=admin))
+    assignment = ok(client.post(
+        "/assignments/independent", json={"group_id": group["id"], "title": "Essay", "description": "d"}, headers=admin
+    ))
+    student = register(client, "student@example.com", group_id=group["id"])
+    upload = {"filename": "essay.pdf", "content_type": "application/pdf", "size": 3}
+    ok(client.post("/assignments/independent/999/upload_url", json=upload, headers=student), 404)
+    ticket = ok(client.post(f"/assignments/independent/{assignment['id']}/upload_url", json=upload, headers=student))
+    s3.put_object(Bucket=BUCKET, Key=ticket["key"], Body=b"pdf")
+
+    confirm = {"key": ticket["key"]}
+    ok(client.post("/assignments/independent/999/confirm_upload", json=confirm, headers=student), 404)
+    url = f"/assignments/independent/{assignment['id']}/confirm_upload"
+    submission = ok(client.post(url, json=confirm, headers=student))
+    assert stored_key(submission["file_url"]) == ticket["key"]
+    ok(client.post(url, json=confirm, headers=student), 409)
+    submissions = ok(client.get(f"/assignments/independent/{assignment['id']}/submissions", headers=admin))
+    assert [row["id"] for row in submissions] == [submission["id"]]
@@ -0,0 +1,15 @@
+import asyncio
+from app import redis_client
+from conftest import ok, register
+
+def test_logout_stores_the_revocation_for_other_workers(client, redis):
+    headers = register(client, "student@example.com")
+    assert ok(client.post("/logout", headers=headers)) == {"message": "Successfully logged out"}
+    assert len(asyncio.run(redis.keys("revoked:*"))) == 1
+    ok(client.get("/feedback/1", headers=headers), 401)
+
+def test_logout_fails_when_the_revocation_cannot_be_stored(client, monkeypatch):
+    headers = register(client, "student@example.com")
+    # The circuit breaker is open: Redis commands are skipped
+    monkeypatch.setattr(redis_client, "is_available", lambda: False)
+    ok(client.post("/logout", headers=headers), 503)
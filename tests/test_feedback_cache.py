@@ -0,0 +1,28 @@
+import asyncio
+from app import feedback_cache, schemas
+
+MISTAKES = [schemas.Answer(question_id=1, selected_answer="b")]
+
+def test_feedback_is_shared_only_between_identical_prompts(redis):
+    feedback_cache.local_entries.clear()
+    prompts = []
+
+    async def feedback(topic_id, correct_count, total_questions, incorrect_answers=MISTAKES):
+        async def generate():
+            prompts.append((topic_id, correct_count, total_questions))
+            return f"feedback {len(prompts)}", 10
+
+        return await feedback_cache.get_or_generate(
+            redis, 1, topic_id, correct_count, total_questions, incorrect_answers, generate
+        )
+
+    async def run():
+        assert await feedback(1, 3, 4) == "feedback 1"
+        assert await feedback(1, 3, 4) == "feedback 1"
+        # Same wrong answer, but unanswered questions change the score the prompt reports
+        assert await feedback(1, 1, 4) == "feedback 2"
+        assert await feedback(2, 3, 4) == "feedback 3"
+        assert await feedback(1, 3, 5) == "feedback 4"
+
+    asyncio.run(run())
+    assert prompts == [(1, 3, 4), (1, 1, 4), (2, 3, 4), (1, 3, 5)]
@@ -0,0 +1,117 @@
+import asyncio
+from datetime import datetime, timedelta
+from sqlalchemy import insert
+from app import gradebook, models
+from app.database import AsyncSessionLocal
+from conftest import ok, register
+
+def backfill():
+    async def run():
+        async with AsyncSessionLocal() as db:
+            return await gradebook.backfill(db)
+
+    return asyncio.run(run())
+
+def insert_rows(model, rows):
+    async def run():
+        async with AsyncSessionLocal() as db:
+            await db.execute(insert(model), rows)
+            await db.commit()
+
+    asyncio.run(run())
+
+def create_test(client, admin, questions):
+    topic = ok(client.post("/admin/topics", json={"title": "Algebra", "description": "d"}, headers=admin))
+    test = ok(client.post("/admin/tests", json={"topic_id": topic["id"], "title": "Quiz"}, headers=admin))
+    test["questions"] = [
+        ok(client.post(
+            "/admin/questions",
+            json={"test_id": test["id"], "question_text": f"Q{q}", "options": ["a", "b"], "correct_answer": "a"},
+            headers=admin,
+        ))
+        for q in range(questions)
+    ]
+    return topic, test
+
+def snapshot(client, admin, group_id, test_id):
+    rows = ok(client.get(f"/groups/{group_id}/gradebook", headers=admin))
+    for row in rows:
+        for entry in row["entries"]:
+            entry.pop("last_attempt_at", None)
+    return rows, ok(client.get(f"/tests/{test_id}/stats", headers=admin))
+
+def test_backfill_matches_live_rollups(client, admin):
+    group = ok(client.post("/admin/groups", json={"name": "Group A"}, headers=admin))
+    students = [register(client, f"student{i}@example.com", group_id=group["id"]) for i in range(2)]
+    topic, test = create_test(client, admin, 4)
+    for headers, answers in ((students[0], "abab"), (students[0], "aaaa"), (students[1], "bbbb")):
+        ok(client.post(
+            f"/tests/{test['id']}/submit",
+            json={
+                "topic_id": topic["id"],
+                "answers": [
+                    {"question_id": q["id"], "selected_answer": answer} for q, answer in zip(test["questions"], answers)
+                ],
+            },
+            headers=headers,
+        ))
+    live = snapshot(client, admin, group["id"], test["id"])
+    assert backfill() == (2, 1)
+    assert snapshot(client, admin, group["id"], test["id"]) == live
+
+def test_backfill_keeps_legacy_attempts_that_straddle_a_second(client, admin):
+    group = ok(client.post("/admin/groups", json={"name": "Group A"}, headers=admin))
+    register(client, "student@example.com", group_id=group["id"])
+    student_id = ok(client.get("/admin/users", headers=admin))[-1]["id"]
+    _, test = create_test(client, admin, 2)
+    # Legacy rows: one timestamp per response, the feedback saved after the answers
+    first = datetime(2024, 1, 1, 12, 0, 0, 999_900)
+    second = datetime(2024, 1, 1, 12, 5)
+    insert_rows(models.UserResponse, [
+        {"user_id": student_id, "question_id": test["questions"][0]["id"], "selected_answer": "a", "submitted_at": first},
+        {
+            "user_id": student_id,
+            "question_id": test["questions"][1]["id"],
+            "selected_answer": "b",
+            "submitted_at": first + timedelta(microseconds=200),
+        },
+        {"user_id": student_id, "question_id": test["questions"][0]["id"], "selected_answer": "a", "submitted_at": second},
+        {"user_id": student_id, "question_id": test["questions"][1]["id"], "selected_answer": "a", "submitted_at": second},
+        # Saved without feedback: the submission never completed
+        {
+            "user_id": student_id,
+            "question_id": test["questions"][1]["id"],
+            "selected_answer": "b",
+            "submitted_at": second + timedelta(minutes=5),
+        },
+    ])
+    insert_rows(models.Feedback, [
+        {"user_id": student_id, "test_id": test["id"], "created_at": first + timedelta(seconds=2)},
+        {"user_id": student_id, "test_id": test["id"], "created_at": second + timedelta(seconds=1)},
+    ])
+    assert backfill() == (1, 1)
+    [row] = ok(client.get(f"/groups/{group['id']}/gradebook", headers=admin))
+    [entry] = row["entries"]
+    assert (entry["attempts"], entry["best_score"], entry["last_score"]) == (2, 100, 100)
+    [stats] = ok(client.get(f"/tests/{test['id']}/stats", headers=admin))["groups"]
+    assert (stats["attempts"], stats["average_score"], stats["passed_students"]) == (2, 75, 1)
+
+def test_backfill_counts_one_answer_per_question_when_a_failed_submit_precedes_a_retry(client, admin):
+    group = ok(client.post("/admin/groups", json={"name": "Group A"}, headers=admin))
+    register(client, "student@example.com", group_id=group["id"])
+    student_id = ok(client.get("/admin/users", headers=admin))[-1]["id"]
+    _, test = create_test(client, admin, 2)
+    failed = datetime(2024, 1, 1, 12, 0)
+    retry = datetime(2024, 1, 1, 12, 3)
+    # The first submit died in the feedback call: responses saved, no feedback row
+    insert_rows(models.UserResponse, [
+        {"user_id": student_id, "question_id": test["questions"][0]["id"], "selected_answer": "a", "submitted_at": failed},
+        {"user_id": student_id, "question_id": test["questions"][1]["id"], "selected_answer": "b", "submitted_at": failed},
+        {"user_id": student_id, "question_id": test["questions"][0]["id"], "selected_answer": "a", "submitted_at": retry},
+        {"user_id": student_id, "question_id": test["questions"][1]["id"], "selected_answer": "a", "submitted_at": retry},
+    ])
+    insert_rows(models.Feedback, [{"user_id": student_id, "test_id": test["id"], "created_at": retry}])
+    assert backfill() == (1, 1)
+    [row] = ok(client.get(f"/groups/{group['id']}/gradebook", headers=admin))
+    [entry] = row["entries"]
+    assert (entry["attempts"], entry["best_score"], entry["last_score"]) == (1, 100, 100)
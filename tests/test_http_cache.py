@@ -0,0 +1,21 @@
+import asyncio
+
+def test_public_reads_are_shared_cacheable(client, admin, redis):
+    topic = client.post("/admin/topics", json={"title": "Algebra", "description": "d"}, headers=admin).json()
+    response = client.get(f"/topics/{topic['id']}/tests")
+    assert response.headers["cache-control"] == "public, max-age=30, must-revalidate"
+    # The body was cached in the test's Redis, not a server that happens to be running
+    assert asyncio.run(redis.keys("cache:*"))
+
+def test_item_analysis_is_private(client, admin):
+    topic = client.post("/admin/topics", json={"title": "Algebra", "description": "d"}, headers=admin).json()
+    test = client.post("/admin/tests", json={"topic_id": topic["id"], "title": "Quiz"}, headers=admin).json()
+    response = client.get(f"/tests/{test['id']}/item-analysis", headers=admin)
+    assert response.status_code == 200
+    assert response.headers["cache-control"] == "private, no-cache"
+    # The 304 for a matching ETag must not make the response shareable either
+    revalidated = client.get(
+        f"/tests/{test['id']}/item-analysis", headers={**admin, "If-None-Match": response.headers["etag"]}
+    )
+    assert revalidated.status_code == 304
+    assert revalidated.headers["cache-control"] == "private, no-cache"
@@ -0,0 +1,58 @@
+import asyncio
+import time
+from app import jobs
+
+QUEUE = "jobs:queue:test"
+
+async def expired_job(redis):
+    await jobs.create_job(redis, QUEUE, {})
+    job = await jobs.claim_next(redis, QUEUE, timeout=1)
+    job["lease_until"] = time.time() - 1
+    await jobs.save_job(redis, job)
+    return job
+
+def test_concurrent_sweeps_requeue_an_expired_job_once(redis, monkeypatch):
+    get_job = jobs.get_job
+
+    async def yielding_get_job(redis, job_id):
+        # fakeredis never yields, so make every sweep read the processing list before any of them removes from it
+        await asyncio.sleep(0)
+        return await get_job(redis, job_id)
+
+    async def run():
+        job = await expired_job(redis)
+        monkeypatch.setattr(jobs, "get_job", yielding_get_job)
+        await asyncio.gather(*(jobs.requeue_expired(redis, QUEUE) for _ in range(3)))
+        assert await redis.lrange(QUEUE, 0, -1) == [job["id"].encode()]
+        assert await redis.llen(jobs.processing_queue(QUEUE)) == 0
+        assert (await jobs.get_job(redis, job["id"]))["status"] == "queued"
+
+    asyncio.run(run())
+
+def test_failing_a_job_that_was_already_requeued_does_not_queue_it_twice(redis):
+    async def run():
+        job = await expired_job(redis)
+        await jobs.requeue_expired(redis, QUEUE)
+        # The worker that held the lease gives up afterwards
+        await jobs.fail_job(redis, job, "boom")
+        assert await redis.lrange(QUEUE, 0, -1) == [job["id"].encode()]
+
+    asyncio.run(run())
+
+def test_job_that_keeps_losing_its_lease_fails_after_the_last_attempt(redis):
+    async def run():
+        await jobs.create_job(redis, QUEUE, {})
+        for attempt in range(1, jobs.JOB_MAX_ATTEMPTS + 1):
+            # The worker dies mid-job, so only the lease sweep ever sees it again
+            job = await jobs.claim_next(redis, QUEUE, timeout=1)
+            assert job["attempts"] == attempt
+            job["lease_until"] = time.time() - 1
+            await jobs.save_job(redis, job)
+            failed = await jobs.requeue_expired(redis, QUEUE)
+        assert [expired["id"] for expired in failed] == [job["id"]]
+        job = await jobs.get_job(redis, job["id"])
+        assert (job["status"], job["errors"]) == ("failed", ["Lease expired"] * jobs.JOB_MAX_ATTEMPTS)
+        assert await redis.llen(QUEUE) == 0
+        assert await redis.llen(jobs.processing_queue(QUEUE)) == 0
+
+    asyncio.run(run())
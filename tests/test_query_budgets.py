@@ -0,0 +1,71 @@
+import pytest
+from app import main
+from app.query_counter import QueryBudgetExceeded
+from conftest import ok, register
+
+@pytest.fixture
+def catalog(client, admin):
+    # Several rows per collection, so a lazy load per row would blow the budgets
+    group = ok(client.post("/admin/groups", json={"name": "Group A"}, headers=admin))
+    students = [register(client, f"student{i}@example.com", group_id=group["id"]) for i in range(3)]
+    topics = []
+    for t in range(3):
+        topic = ok(client.post("/admin/topics", json={"title": f"Topic {t}", "description": "d"}, headers=admin))
+        ok(client.post(
+            f"/admin/topics/{topic['id']}/items/bulk",
+            json={"items": [{"type": "text", "content": f"page {i}"} for i in range(3)]},
+            headers=admin,
+        ))
+        topics.append(topic)
+    tests = []
+    for t in range(2):
+        test = ok(client.post("/admin/tests", json={"topic_id": topics[0]["id"], "title": f"Test {t}"}, headers=admin))
+        test["questions"] = [
+            ok(client.post(
+                "/admin/questions",
+                json={"test_id": test["id"], "question_text": f"Q{q}", "options": ["a", "b"], "correct_answer": "a"},
+                headers=admin,
+            ))
+            for q in range(4)
+        ]
+        tests.append(test)
+    assignment = ok(client.post(
+        "/assignments/independent", json={"group_id": group["id"], "title": "Essay", "description": "d"}, headers=admin
+    ))
+    return {"group": group, "students": students, "topics": topics, "tests": tests, "assignment": assignment}
+
+def submit(client, headers, topic, test, answer):
+    return ok(client.post(
+        f"/tests/{test['id']}/submit",
+        json={
+            "topic_id": topic["id"],
+            "answers": [{"question_id": q["id"], "selected_answer": answer} for q in test["questions"]],
+        },
+        headers=headers,
+    ))
+
+def test_budgeted_endpoints_stay_within_budget(client, admin, catalog):
+    # Each read below is the first of its cache key, so it runs against a cold cache
+    topic, test = catalog["topics"][0], catalog["tests"][0]
+    for headers, answer in zip(catalog["students"], ["a", "b", "a"]):
+        submit(client, headers, topic, test, answer)
+    assert submit(client, catalog["students"][0], topic, test, "a")["score"] == 100
+
+    assert len(ok(client.get("/topics"))) == 3
+    assert len(ok(client.get(f"/topics/{topic['id']}"))["items"]) == 3
+    assert len(ok(client.get(f"/topics/{topic['id']}/tests"))) == 2
+    assert len(ok(client.get(f"/tests/{test['id']}/questions"))) == 4
+    stats = ok(client.get(f"/tests/{test['id']}/stats", headers=admin))
+    assert stats["groups"][0]["attempts"] == 4
+    assert ok(client.get(f"/tests/{test['id']}/item-analysis", headers=admin))["students"] == 3
+    gradebook = ok(client.get(f"/groups/{catalog['group']['id']}/gradebook", headers=admin))
+    assert [len(row["entries"]) for row in gradebook] == [1, 1, 1]
+    assert len(ok(client.get("/admin/users", headers=admin))) == 4
+    assert len(ok(client.get("/admin/groups", headers=admin))[0]["users"]) == 3
+    assignment_id = catalog["assignment"]["id"]
+    assert ok(client.get(f"/assignments/independent/{assignment_id}/submissions", headers=admin)) == []
+
+def test_exceeding_a_budget_fails_the_request(client, catalog, monkeypatch):
+    monkeypatch.setitem(main.QUERY_BUDGETS, "GET /topics", 0)
+    with pytest.raises(QueryBudgetExceeded):
+        client.get("/topics?limit=50")
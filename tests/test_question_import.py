@@ -0,0 +1,58 @@
+import csv
+from tempfile import SpooledTemporaryFile
+from app import question_import
+from conftest import ok
+
+def test_text_stream_reads_spooled_uploads():
+    # UploadFile.file is a SpooledTemporaryFile, which TextIOWrapper rejects on Python 3.10
+    spooled = SpooledTemporaryFile(max_size=1024)
+    spooled.write('﻿test_id,question_text\n1,"two\nlines"\n'.encode())
+    spooled.seek(0)
+    assert list(csv.DictReader(question_import.text_stream(spooled))) == [{"test_id": "1", "question_text": "two\nlines"}]
+
+def test_import_csv_through_endpoint(client, admin):
+    topic = ok(client.post("/admin/topics", json={"title": "Algebra", "description": "d"}, headers=admin))
+    test = ok(client.post("/admin/tests", json={"topic_id": topic["id"], "title": "Quiz"}, headers=admin))
+    assert ok(client.get(f"/tests/{test['id']}/questions")) == []
+    rows = (
+        "﻿test_id,topic_id,test_title,question_text,options,correct_answer\n"
+        f"{test['id']},,,2+2?,3|4|5,4\n"
+        f',{topic["id"]},Final,"Spans\ntwo lines","[""a"",""b""]",a\n'
+        "999,,,Orphan,a|b,a\n"
+        f"{test['id']},,,Bad key,a|b,c\n"
+    )
+    report = ok(client.post(
+        "/admin/tests/import", files={"file": ("bank.csv", rows.encode())}, headers=admin
+    ))
+    assert (report["tests_created"], report["questions_created"], report["error_count"]) == (1, 2, 2)
+    assert sorted(error["line"] for error in report["errors"]) == [5, 6]
+    # Cached question and test lists were invalidated once the import committed
+    assert [q["question_text"] for q in ok(client.get(f"/tests/{test['id']}/questions"))] == ["2+2?"]
+    assert sorted(t["title"] for t in ok(client.get(f"/topics/{topic['id']}/tests"))) == ["Final", "Quiz"]
+
+def test_import_jsonl_reports_bad_lines(client, admin):
+    topic = ok(client.post("/admin/topics", json={"title": "Algebra", "description": "d"}, headers=admin))
+    test = ok(client.post("/admin/tests", json={"topic_id": topic["id"], "title": "Quiz"}, headers=admin))
+    lines = (
+        f'{{"test_id": {test["id"]}, "question_text": "Q", "options": ["x", "y"], "correct_answer": "x"}}\n'
+        "not json\n"
+        f'{{"test_id": {test["id"]}, "options": ["x"]}}\n'
+    )
+    report = ok(client.post("/admin/tests/import", files={"file": ("bank.jsonl", lines.encode())}, headers=admin))
+    assert report["questions_created"] == 1
+    assert [error["line"] for error in report["errors"]] == [2, 3]
+
+def test_import_rejects_unreadable_files(client, admin):
+    ok(client.post("/admin/tests/import", files={"file": ("bank.txt", b"x")}, headers=admin), 400)
+    ok(client.post("/admin/tests/import", files={"file": ("bank.csv", b"\xff\xfe\x00")}, headers=admin), 400)
+
+def test_import_keeps_unicode_line_separators_inside_records(client, admin):
+    topic = ok(client.post("/admin/topics", json={"title": "Algebra", "description": "d"}, headers=admin))
+    test = ok(client.post("/admin/tests", json={"topic_id": topic["id"], "title": "Quiz"}, headers=admin))
+    jsonl = f'{{"test_id": {test["id"]}, "question_text": "First\u2028second", "options": ["x", "y"], "correct_answer": "x"}}\n'
+    csv_rows = f"test_id,question_text,options,correct_answer\n{test['id']},Next\u0085line,x|y,x\n"
+    for filename, data in (("bank.jsonl", jsonl), ("bank.csv", csv_rows)):
+        report = ok(client.post("/admin/tests/import", files={"file": (filename, data.encode())}, headers=admin))
+        assert (report["questions_created"], report["error_count"]) == (1, 0), report
+    texts = [q["question_text"] for q in ok(client.get(f"/tests/{test['id']}/questions"))]
+    assert texts == ["First\u2028second", "Next\u0085line"]
@@ -0,0 +1,21 @@
+import asyncio
+from sqlalchemy import func, select
+from app import jobs, models
+from app.database import AsyncSessionLocal
+from conftest import ok, register
+
+def count(model):
+    async def run():
+        async with AsyncSessionLocal() as db:
+            return await db.scalar(select(func.count()).select_from(model))
+
+    return asyncio.run(run())
+
+def test_submitting_to_a_test_without_questions_stores_nothing(client, admin, redis):
+    topic = ok(client.post("/admin/topics", json={"title": "Algebra", "description": "d"}, headers=admin))
+    empty = ok(client.post("/admin/tests", json={"topic_id": topic["id"], "title": "Quiz"}, headers=admin))
+    student = register(client, "student@example.com")
+    for test_id in (999, empty["id"]):
+        ok(client.post(f"/tests/{test_id}/submit", json={"topic_id": topic["id"], "answers": []}, headers=student), 404)
+    assert [count(model) for model in (models.Feedback, models.GradebookEntry, models.UserResponse)] == [0, 0, 0]
+    assert asyncio.run(redis.llen(jobs.FEEDBACK_QUEUE)) == 0
@@ -0,0 +1,19 @@
+import asyncio
+from app import crud
+from app.database import AsyncSessionLocal
+
+def test_bulk_items_require_at_least_one_item(client, admin):
+    topic = client.post("/admin/topics", json={"title": "Algebra", "description": "d"}, headers=admin).json()
+    response = client.post(f"/admin/topics/{topic['id']}/items/bulk", json={"items": []}, headers=admin)
+    assert response.status_code == 422
+    assert client.get(f"/topics/{topic['id']}").json()["items"] == []
+
+def test_create_topic_items_with_no_items_inserts_nothing(client, admin):
+    topic = client.post("/admin/topics", json={"title": "Algebra", "description": "d"}, headers=admin).json()
+
+    async def create():
+        async with AsyncSessionLocal() as db:
+            return await crud.create_topic_items(db, topic["id"], [], order=0)
+
+    assert asyncio.run(create()) == []
+    assert client.get(f"/topics/{topic['id']}").json()["items"] == []
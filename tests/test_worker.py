@@ -0,0 +1,38 @@
+import asyncio
+from app import jobs, openai_service, worker
+from app.database import async_engine
+from conftest import ok, register
+
+def test_feedback_job_holds_no_connection_during_the_provider_call(client, admin, redis, monkeypatch):
+    topic = ok(client.post("/admin/topics", json={"title": "Algebra", "description": "d"}, headers=admin))
+    test = ok(client.post("/admin/tests", json={"topic_id": topic["id"], "title": "Quiz"}, headers=admin))
+    question = ok(client.post(
+        "/admin/questions",
+        json={"test_id": test["id"], "question_text": "2+2?", "options": ["3", "4"], "correct_answer": "4"},
+        headers=admin,
+    ))
+    student = register(client, "student@example.com")
+    result = ok(client.post(
+        f"/tests/{test['id']}/submit",
+        json={"topic_id": topic["id"], "answers": [{"question_id": question["id"], "selected_answer": "3"}]},
+        headers=student,
+    ))
+    assert result["feedback_status"] == "pending"
+    checked_out = []
+
+    async def provider(prompt):
+        checked_out.append(async_engine.pool.checkedout())
+        assert "'Algebra'" in prompt
+        return "Review addition.", 42
+
+    monkeypatch.setitem(openai_service.PROVIDERS, openai_service.FEEDBACK_PROVIDER, provider)
+
+    async def run():
+        job = await jobs.claim_next(redis, jobs.FEEDBACK_QUEUE, timeout=1)
+        await worker.process_feedback(redis, job)
+        assert (await jobs.get_job(redis, job["id"]))["status"] == "done"
+
+    asyncio.run(run())
+    assert checked_out == [0]
+    feedback = ok(client.get(f"/feedback/{result['feedback_id']}", headers=student))
+    assert (feedback["status"], feedback["feedback_text"]) == ("ready", "Review addition.")